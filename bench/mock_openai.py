@@ -0,0 +1,283 @@
+"""
+Local OpenAI-compatible server for offline runs of ralph_graph and ralph-agent.
+
+Replay (no network):
+    python bench/mock_openai.py --transcript run.jsonl --latency 0.3 --tps 200
+    OPENROUTER_BASE_URL=http://127.0.0.1:8766/v1 python ralph_graph/main.py
+
+Record a real run (proxies to OpenRouter and appends every exchange to the transcript):
+    python bench/mock_openai.py --record run.jsonl --upstream https://openrouter.ai/api/v1
+
+Transcript format (JSONL, one exchange per line):
+    {"conv": "<sha1 of the system prompt>" | "match": "<substring of the system prompt>",
+     "turn": <assistant messages already in the request>,
+     "message": {"content": "...", "tool_calls": [{"id": "...", "name": "...", "arguments": {...}}]}}
+
+Requests are matched on (conversation, turn) rather than on the full history, so replays stay
+deterministic when tool outputs differ slightly (timestamps, paths) from the recorded run.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import requests
+
+# Rough chars per token, used for usage numbers and stream pacing
+CHARS_PER_TOKEN = 4
+
+def _text(content) -> str:
+    if isinstance(content, list):
+        return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    return content or ""
+
+def system_text(messages: List[dict]) -> str:
+    return next((_text(m.get("content")) for m in messages if m.get("role") == "system"), "")
+
+def conversation_key(messages: List[dict]) -> str:
+    return hashlib.sha1(system_text(messages).encode("utf-8")).hexdigest()
+
+def turn_index(messages: List[dict]) -> int:
+    return sum(1 for m in messages if m.get("role") == "assistant")
+
+class Transcript:
+    """Recorded exchanges indexed by (conversation, turn); `match` entries are checked in file order."""
+
+    def __init__(self, entries: List[dict]):
+        self.by_conv: Dict[tuple, dict] = {}
+        self.by_match: List[dict] = []
+        for entry in entries:
+            if entry.get("conv"):
+                self.by_conv[(entry["conv"], entry.get("turn", 0))] = entry
+            elif entry.get("match") is not None:
+                self.by_match.append(entry)
+
+    @classmethod
+    def load(cls, path: str) -> "Transcript":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def lookup(self, messages: List[dict]) -> Optional[dict]:
+        turn = turn_index(messages)
+        entry = self.by_conv.get((conversation_key(messages), turn))
+        if entry:
+            return entry
+        system = system_text(messages)
+        for entry in self.by_match:
+            if entry.get("turn", 0) == turn and entry["match"] in system:
+                return entry
+        return None
+
+# Returned when nothing matches: no tool calls, so every agent loop terminates
+FALLBACK_MESSAGE = {"content": "DONE (no recorded response for this request)", "tool_calls": []}
+
+def _tool_calls_payload(tool_calls: List[dict]) -> List[dict]:
+    return [{
+        "id": tc.get("id") or f"call_{uuid.uuid4().hex[:12]}",
+        "type": "function",
+        "function": {"name": tc["name"], "arguments": json.dumps(tc.get("arguments", {}))}
+    } for tc in tool_calls]
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._json({"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        elif self.path == "/stats":
+            with self.server.lock:
+                self._json(dict(self.server.stats))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        messages = body.get("messages", [])
+        server = self.server
+
+        with server.lock:
+            server.stats["requests"] += 1
+
+        if server.upstream:
+            message, usage = self._forward(body)
+        else:
+            entry = server.transcript.lookup(messages) if server.transcript else None
+            with server.lock:
+                server.stats["hits" if entry else "misses"] += 1
+            message = entry["message"] if entry else FALLBACK_MESSAGE
+            usage = self._usage(messages, message)
+            if server.latency:
+                time.sleep(server.latency)
+
+        tool_calls = _tool_calls_payload(message.get("tool_calls") or [])
+        with server.lock:
+            server.stats["tool_calls"] += len(tool_calls)
+        model = body.get("model", "mock")
+        if body.get("stream"):
+            self._stream(model, message.get("content") or "", tool_calls, usage, body)
+        else:
+            msg = {"role": "assistant", "content": message.get("content") or ""}
+            if tool_calls:
+                msg["tool_calls"] = tool_calls
+            self._json({
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": msg, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+                "usage": usage
+            })
+
+    def _usage(self, messages: List[dict], message: dict) -> dict:
+        """Estimated usage; cached tokens simulate a provider prefix cache per conversation."""
+        prompt = json.dumps(messages, sort_keys=True)
+        conv = conversation_key(messages)
+        with self.server.lock:
+            previous = self.server.prefixes.get(conv, "")
+            self.server.prefixes[conv] = prompt
+        shared = 0
+        for a, b in zip(previous, prompt):
+            if a != b:
+                break
+            shared += 1
+        completion = _text(message.get("content")) + json.dumps(message.get("tool_calls") or [])
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+        completion_tokens = len(completion) // CHARS_PER_TOKEN
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": shared // CHARS_PER_TOKEN}
+        }
+
+    def _forward(self, body: dict):
+        """Record mode: the real call is made non-streaming, the client still gets the format it asked for."""
+        server = self.server
+        upstream_body = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        started = time.monotonic()
+        response = server.session.post(
+            f"{server.upstream}/chat/completions",
+            json=upstream_body,
+            headers={"Authorization": self.headers.get("Authorization", "")},
+            timeout=600
+        )
+        response.raise_for_status()
+        data = response.json()
+        raw = data["choices"][0]["message"]
+        message = {
+            "content": raw.get("content") or "",
+            "tool_calls": [{
+                "id": tc["id"],
+                "name": tc["function"]["name"],
+                "arguments": json.loads(tc["function"].get("arguments") or "{}")
+            } for tc in raw.get("tool_calls") or []]
+        }
+        messages = body.get("messages", [])
+        entry = {
+            "conv": conversation_key(messages),
+            "turn": turn_index(messages),
+            "model": body.get("model"),
+            "latency": round(time.monotonic() - started, 3),
+            "message": message
+        }
+        with server.lock:
+            with open(server.record_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        return message, data.get("usage") or self._usage(messages, message)
+
+    def _stream(self, model: str, content: str, tool_calls: List[dict], usage: dict, body: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        # Seconds per chunk of ~8 tokens
+        step = 8 * CHARS_PER_TOKEN
+        delay = (8 / self.server.tps) if self.server.tps else 0
+
+        def send(delta: dict, finish: Optional[str] = None, extra: Optional[dict] = None):
+            payload = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+            }
+            if extra:
+                payload.update(extra)
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send({"role": "assistant", "content": ""})
+        for i in range(0, len(content), step):
+            send({"content": content[i:i + step]})
+            time.sleep(delay)
+        for index, tc in enumerate(tool_calls):
+            args = tc["function"]["arguments"]
+            send({"tool_calls": [{"index": index, "id": tc["id"], "type": "function",
+                                  "function": {"name": tc["function"]["name"], "arguments": ""}}]})
+            for i in range(0, len(args), step):
+                send({"tool_calls": [{"index": index, "function": {"arguments": args[i:i + step]}}]})
+                time.sleep(delay)
+        send({}, finish="tool_calls" if tool_calls else "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self.wfile.write(f"data: {json.dumps({'id': chunk_id, 'object': 'chat.completion.chunk', 'model': model, 'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _json(self, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_server(port: int = 0, transcript: Optional[Transcript] = None, latency: float = 0.0, tps: float = 0.0,
+                      record_path: Optional[str] = None, upstream: Optional[str] = None) -> ThreadingHTTPServer:
+    """Starts the server in a daemon thread. Base URL: http://127.0.0.1:<server.server_port>/v1"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.transcript = transcript
+    server.latency = latency
+    server.tps = tps
+    server.record_path = record_path
+    server.upstream = upstream.rstrip("/") if upstream else None
+    server.session = requests.Session()
+    server.stats = {"requests": 0, "hits": 0, "misses": 0, "tool_calls": 0}
+    server.prefixes = {}
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible replay / record server")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--transcript", help="JSONL transcript to replay")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay before each response (seconds)")
+    parser.add_argument("--tps", type=float, default=0.0, help="Streaming speed in tokens per second (0 = instant)")
+    parser.add_argument("--record", help="Record mode: append exchanges to this JSONL file")
+    parser.add_argument("--upstream", default="https://openrouter.ai/api/v1", help="Upstream API for record mode")
+    args = parser.parse_args()
+
+    transcript = Transcript.load(args.transcript) if args.transcript else None
+    mock = start_mock_server(
+        args.port, transcript, args.latency, args.tps,
+        record_path=args.record, upstream=args.upstream if args.record else None
+    )
+    mode = f"recording to {args.record}" if args.record else f"replaying {args.transcript or '(fallback only)'}"
+    print(f"Mock OpenAI server on http://127.0.0.1:{mock.server_port}/v1, {mode}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock.shutdown()
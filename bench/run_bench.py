@@ -0,0 +1,216 @@
+"""
+Offline benchmark for ralph_graph (create_graph) and ralph-agent (RalphAgent.run_loop).
+Both run against bench/mock_openai.py, so no network or API key is needed (CI friendly).
+
+Usage:
+    python bench/run_bench.py graph --workers 8 --latency 0.2 --tps 300
+    python bench/run_bench.py agent --workers 4 --transcript recorded.jsonl
+    python bench/run_bench.py graph --out bench_output.json
+    python bench/run_bench.py graph --max-import-seconds 1.5   # exits 1 when the import budget is exceeded
+
+Reports per-node latency, wall time per iteration, tool throughput and peak memory as JSON.
+Each target runs in its own process (both packages have a top-level `config` module).
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_openai import Transcript, start_mock_server
+from scenarios import SCENARIOS
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux (bytes on macOS)
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / scale, 1)
+
+def summarize(durations: dict) -> dict:
+    return {
+        name: {
+            "count": len(values),
+            "total": round(sum(values), 3),
+            "mean": round(sum(values) / len(values), 3),
+            "max": round(max(values), 3),
+        }
+        for name, values in sorted(durations.items())
+    }
+
+def prepare_workspace() -> str:
+    workspace = tempfile.mkdtemp(prefix="ralph-bench-")
+    # git_commit ends the run; it needs a repository
+    subprocess.run(["git", "init", "-q"], cwd=workspace, check=True)
+    subprocess.run(["git", "config", "user.email", "bench@localhost"], cwd=workspace, check=True)
+    subprocess.run(["git", "config", "user.name", "bench"], cwd=workspace, check=True)
+    return workspace
+
+def bench_graph(args, node_durations: dict, iterations: list):
+    sys.path.insert(0, os.path.join(REPO_DIR, "ralph_graph"))
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    started = time.perf_counter()
+    import app
+    from prompt_cache import build_system_message
+    from token_ledger import count_message_tokens
+    import_seconds = time.perf_counter() - started
+    # Clients and agents are built lazily (nodes.get_llm / create_*_agent); the SDK must not load on import
+    eager_modules = [m for m in ("openai", "langchain_openai", "langgraph.prebuilt") if m in sys.modules]
+
+    class NodeTimer(BaseCallbackHandler):
+        """Times every graph node run (nested sub-agent nodes are reported as `<outer>/<node>`)."""
+
+        def __init__(self):
+            self.starts = {}
+
+        def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+            metadata = metadata or {}
+            name = kwargs.get("name")
+            if name and metadata.get("langgraph_node") == name:
+                namespace = metadata.get("langgraph_checkpoint_ns", "")
+                outer = namespace.split(":", 1)[0] if "|" in namespace else None
+                self.starts[run_id] = (f"{outer}/{name}" if outer else name, time.perf_counter())
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            entry = self.starts.pop(run_id, None)
+            if entry:
+                node_durations[entry[0]].append(time.perf_counter() - entry[1])
+
+        on_chain_error = on_chain_end
+
+    async def run():
+        graph = app.create_graph()
+        system_message = build_system_message("build.md")
+        state = {
+            "messages": [system_message],
+            "token_count": count_message_tokens([system_message]),
+            "pending_tasks": [],
+            "results": {},
+            "iteration": 0
+        }
+        # One graph run for the whole session; iterations end at the reducer (see app.ends_iteration)
+        config = app.run_config(0, args.max_iterations, callbacks=[NodeTimer()])
+        t0 = time.perf_counter()
+        async for update in graph.astream(state, config=config, stream_mode="updates"):
+            if app.ends_iteration(update):
+                now = time.perf_counter()
+                iterations.append(now - t0)
+                t0 = now
+
+    asyncio.run(run())
+    from usage import usage_ledger
+    return {"import_seconds": round(import_seconds, 3), "eager_modules": eager_modules, "usage": usage_ledger.summary()["total"]}
+
+def bench_agent(args, node_durations: dict, iterations: list):
+    sys.path.insert(0, os.path.join(REPO_DIR, "ralph-agent"))
+    from openai import OpenAI
+
+    started = time.perf_counter()
+    import config
+    from internal.agent import RalphAgent
+    from internal.tools import COMMON_TOOLS, AUTHOR_TOOLS, MANAGER_TOOLS
+    from internal.usage import get_run_id, write_summary
+    import_seconds = time.perf_counter() - started
+
+    with open(os.path.join(config.PROMPTS_DIR, "build.md"), "r") as f:
+        system_prompt = f.read()
+    client = OpenAI(base_url=config.OPENROUTER_BASE_URL, api_key=config.OPENROUTER_API_KEY)
+    agent = RalphAgent(
+        client=client,
+        model=config.RALPH_MODEL,
+        system_prompt=system_prompt,
+        tools=COMMON_TOOLS + AUTHOR_TOOLS + MANAGER_TOOLS,
+        name="Ralph(Bench)"
+    )
+
+    run_id = get_run_id()
+    step = agent.step
+
+    def timed_step():
+        t0 = time.perf_counter()
+        try:
+            return step()
+        finally:
+            elapsed = time.perf_counter() - t0
+            iterations.append(elapsed)
+            node_durations["step"].append(elapsed)
+
+    agent.step = timed_step
+    status = agent.run_loop(max_steps=args.max_iterations)
+    agent.tool_manager.executor.shutdown()
+    return {"import_seconds": round(import_seconds, 3), "status": status, "usage": write_summary(run_id)["total"]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ralph benchmark against the mock OpenAI server")
+    parser.add_argument("target", choices=["graph", "agent"])
+    parser.add_argument("--transcript", help="Recorded transcript (default: synthetic fan-out scenario)")
+    parser.add_argument("--workers", type=int, default=4, help="Fan-out width of the synthetic scenario")
+    parser.add_argument("--latency", type=float, default=0.1, help="Mock LLM latency per request (seconds)")
+    parser.add_argument("--tps", type=float, default=0.0, help="Mock streaming speed in tokens per second (0 = instant)")
+    parser.add_argument("--max-iterations", type=int, default=20)
+    parser.add_argument("--out", help="Write the JSON report here as well")
+    parser.add_argument("--max-import-seconds", type=float, help="Fail (exit 1) when importing the target takes longer")
+    args = parser.parse_args()
+
+    if args.transcript:
+        transcript = Transcript.load(args.transcript)
+    else:
+        transcript = Transcript(SCENARIOS[args.target](args.workers))
+    server = start_mock_server(0, transcript, args.latency, args.tps)
+
+    # Must be set before the target's config module is imported
+    workspace = prepare_workspace()
+    os.environ.update({
+        "OPENROUTER_BASE_URL": f"http://127.0.0.1:{server.server_port}/v1",
+        "OPENROUTER_API_KEY": "bench",
+        "RALPH_WORKSPACE_DIR": workspace,
+        "RALPH_CHECKPOINT_DIR": os.path.join(workspace, ".checkpoints"),
+    })
+
+    node_durations = defaultdict(list)
+    iterations = []
+    started = time.perf_counter()
+    runner = bench_graph if args.target == "graph" else bench_agent
+    extra = runner(args, node_durations, iterations)
+    wall = time.perf_counter() - started
+
+    with server.lock:
+        stats = dict(server.stats)
+    report = {
+        "target": args.target,
+        "scenario": args.transcript or f"synthetic fan-out x{args.workers}",
+        "mock_latency": args.latency,
+        "mock_tps": args.tps,
+        "wall_seconds": round(wall, 3),
+        "iterations": [round(t, 3) for t in iterations],
+        "nodes": summarize(node_durations),
+        "llm_requests": stats["requests"],
+        "transcript_misses": stats["misses"],
+        "tool_calls": stats["tool_calls"],
+        "tool_calls_per_second": round(stats["tool_calls"] / wall, 2) if wall else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "workspace": workspace,
+        **extra,
+    }
+    server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    if args.max_import_seconds is not None and report["import_seconds"] > args.max_import_seconds:
+        sys.exit(f"Import budget exceeded: {report['import_seconds']}s > {args.max_import_seconds}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Synthetic transcripts for bench/mock_openai.py, so benchmarks run without a recorded session.
+Each scenario is a Manager turn that fans out N file-writing tasks, then a git_commit turn.
+"""
+from typing import List
+
+def _task(i: int) -> str:
+    return f"bench task {i}: write notes/task-{i}.md"
+
+def _writer_turns(i: int, match: str) -> List[dict]:
+    # `match` must be unique to this sub-agent's system prompt
+    return [
+        {"match": match, "turn": 0, "message": {"content": "", "tool_calls": [
+            {"name": "write_file", "arguments": {"path": f"notes/task-{i}.md", "content": f"# Task {i}\n\n" + "lorem ipsum " * 200}}
+        ]}},
+        {"match": match, "turn": 1, "message": {"content": f"Task {i} DONE", "tool_calls": []}},
+    ]
+
+def graph_fanout(workers: int) -> List[dict]:
+    """ralph_graph: PlanTasks with `workers` tasks + a structured DelegateAdmin, then git_commit."""
+    entries = []
+    for i in range(workers):
+        entries += _writer_turns(i, _task(i) + ".")
+    entries += [
+        # build.md is the Manager prompt; worker prompts never contain it
+        {"match": "IMPLEMENTATION_PLAN", "turn": 0, "message": {"content": "Delegating.", "tool_calls": [
+            {"name": "PlanTasks", "arguments": {"tasks": [{"description": _task(i)} for i in range(workers)]}},
+            {"name": "DelegateAdmin", "arguments": {"operations": [{"op": "list", "path": "."}]}},
+        ]}},
+        {"match": "IMPLEMENTATION_PLAN", "turn": 1, "message": {"content": "", "tool_calls": [
+            {"name": "git_commit", "arguments": {"message": "bench: notes"}}
+        ]}},
+    ]
+    return entries
+
+def agent_fanout(workers: int) -> List[dict]:
+    """ralph-agent: `workers` delegate_subagent calls (each a sub-process agent), then git_commit."""
+    entries = []
+    for i in range(workers):
+        entries += _writer_turns(i, _task(i) + "\n")
+    entries += [
+        # Only the Manager's build.md contains this sentence
+        {"match": "@IMPLEMENTATION_PLAN.md is complete", "turn": 0, "message": {"content": "Delegating.", "tool_calls": [
+            {"name": "delegate_subagent", "arguments": {"instructions": _task(i), "file_paths": []}} for i in range(workers)
+        ]}},
+        {"match": "@IMPLEMENTATION_PLAN.md is complete", "turn": 1, "message": {"content": "", "tool_calls": [
+            {"name": "git_commit", "arguments": {"message": "bench: notes"}}
+        ]}},
+    ]
+    return entries
+
+SCENARIOS = {
+    "graph": graph_fanout,
+    "agent": agent_fanout,
+}
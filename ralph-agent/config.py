@@ -5,6 +5,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+# OpenAI-compatible endpoint (point at bench/mock_openai.py for offline runs)
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 if not OPENROUTER_API_KEY:
     print("Warning: OPENROUTER_API_KEY not found in environment or .env file.")
 
@@ -12,6 +14,15 @@ if not OPENROUTER_API_KEY:
 RALPH_MODEL = os.getenv("RALPH_MODEL", "google/gemini-flash-1.5")
 SUBAGENT_MODEL = os.getenv("SUBAGENT_MODEL", RALPH_MODEL)
 
+# Optional prices (USD per 1M prompt/completion tokens) used when the provider does not report the cost,
+# e.g. "google/gemini-flash-1.5=0.075/0.3"
+MODEL_PRICES = {
+    model.strip(): tuple(float(p) for p in prices.split("/"))
+    for model, _, prices in (
+        item.rpartition("=") for item in os.getenv("RALPH_MODEL_PRICES", "").split(",") if "=" in item
+    )
+}
+
 # Agent Loop Limits
 MAIN_AGENT_MAX_STEPS = int(os.getenv("RALPH_MAIN_MAX_STEPS", "200"))
 SUBAGENT_MAX_STEPS = int(os.getenv("RALPH_SUBAGENT_MAX_STEPS", "100"))
@@ -4,6 +4,7 @@ from openai import OpenAI
 from termcolor import colored
 from .tools import TOOL_FUNCTIONS
 from .tool_manager import ToolManager
+from .usage import record_usage
 
 class RalphAgent:
     def __init__(self, client: OpenAI, model: str, system_prompt: str, tools: list, name: str = "Ralph"):
@@ -13,6 +14,7 @@ class RalphAgent:
         self.name = name
         self.logger = logging.getLogger(name)
         self.tool_manager = ToolManager(logger_name=f"{name}.ToolManager")
+        self.turn = 0
         
         # Dynamic Tool Manifest
         tool_manifest = self._generate_tool_manifest(tools)
@@ -47,17 +49,25 @@ class RalphAgent:
 
     def step(self):
         """Execute one turn of the agent loop."""
+        self.turn += 1
         try:
             completion = self.client.chat.completions.create(
                 model=self.model,
                 messages=self.messages,
                 tools=self.tools,
-                tool_choice="auto" if self.tools else "none"
+                tool_choice="auto" if self.tools else "none",
+                # OpenRouter: include cached tokens and cost in `usage`
+                extra_body={"usage": {"include": True}}
             )
         except Exception as e:
             self.logger.error(f"API Error: {e}")
             return f"API Error: {e}"
 
+        try:
+            record_usage(completion, self.name, self.turn)
+        except Exception as e:
+            self.logger.warning(f"Failed to record usage: {e}")
+
         message = completion.choices[0].message
         self.messages.append(message)
 
@@ -6,6 +6,7 @@ from termcolor import colored
 import config
 from .agent import RalphAgent
 from .tools import COMMON_TOOLS, AUTHOR_TOOLS, MANAGER_TOOLS
+from .usage import get_run_id, write_summary
 import logging
 
 # Configure Logging
@@ -33,10 +34,12 @@ def main():
         sys.exit(1)
 
     print(colored(f"Starting Ralph in {args.mode.upper()} mode...", "green"))
+    # Set before any sub-agent process starts so their usage is tagged with the same run
+    run_id = get_run_id()
 
     # Initialize Client
     client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
+        base_url=config.OPENROUTER_BASE_URL,
         api_key=config.OPENROUTER_API_KEY,
     )
 
@@ -65,6 +68,9 @@ def main():
 
     # Run Loop
     exit_status = agent.run_loop(max_steps=config.MAIN_AGENT_MAX_STEPS)
+
+    summary = write_summary(run_id)
+    print(colored(f"Usage: {summary['total']}", "blue"))
     
     # If the helper returns "DONE" via git commit, we exit 0 to restart.
     if exit_status == "DONE":
@@ -0,0 +1,11 @@
+# Persistent shell sessions are shared with ralph_graph (one implementation in ralph_graph/shell_session.py)
+import os
+import sys
+
+_GRAPH_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "ralph_graph"))
+if _GRAPH_DIR not in sys.path:
+    sys.path.append(_GRAPH_DIR)
+
+from shell_session import ShellResult, ShellSession, ShellSessionPool, history_line
+
+__all__ = ["ShellResult", "ShellSession", "ShellSessionPool", "history_line"]
@@ -35,7 +35,7 @@ def run_worker(payload: dict) -> str:
 
     # Initialize Client
     client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
+        base_url=config.OPENROUTER_BASE_URL,
         api_key=api_key,
     )
 
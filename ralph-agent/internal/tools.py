@@ -4,6 +4,7 @@ import subprocess
 import uuid
 import logging
 from config import WORKSPACE_DIR, INTERNAL_DIR, PROMPTS_DIR, OPENROUTER_API_KEY, SUBAGENT_MODEL
+from .shell_session import ShellSessionPool, history_line
 
 class ToolError(Exception):
     pass
@@ -56,31 +57,37 @@ def list_dir(path: str):
     except Exception as e:
         return f"Error listing directory: {e}"
 
+# One long-lived shell per process in the workspace container (see shell_session.py).
+# The command history is appended by the same shell instead of a second `docker exec`.
+HISTORY_FILE = f"{WORKSPACE_DIR}/command_history.log"
+shell_sessions = ShellSessionPool(
+    argv=["docker", "exec", "-i", "-w", WORKSPACE_DIR, "ralph-workspace", "/bin/sh"],
+    exec_prefix=["docker", "exec", "ralph-workspace"],
+    history_file=HISTORY_FILE
+)
+
 def run_command(command: str):
     """Executes a command inside the persistent 'ralph-workspace' container."""
     try:
-        # Log command
-        try:
-             safe_cmd_str = command.replace("'", "'\\''")
-             log_cmd = ["docker", "exec", "ralph-workspace", "sh", "-c", f"echo '{safe_cmd_str}' >> {WORKSPACE_DIR}/command_history.log"]
-             subprocess.run(log_cmd, check=False)
-        except Exception:
-             pass 
-
-        # Execute
-        docker_cmd = [
-            "docker", "exec", 
-            "-w", WORKSPACE_DIR,
-            "ralph-workspace", 
-            "/bin/sh", "-c", command
-        ]
-        
-        result = subprocess.run(docker_cmd, capture_output=True, text=True, timeout=120)
+        result = shell_sessions.try_run(command, timeout=120)
+        if result is None:
+            # Session busy: one-shot exec (recorded in the history like session commands)
+            docker_cmd = [
+                "docker", "exec", 
+                "-w", WORKSPACE_DIR,
+                "ralph-workspace", 
+                "/bin/sh", "-c", f"{history_line(command, HISTORY_FILE)}\n{command}"
+            ]
+            result = subprocess.run(docker_cmd, capture_output=True, text=True, timeout=120)
         
         output = f"STDOUT:\n{result.stdout}\nSTDERR:\n{result.stderr}"
         if result.returncode != 0:
              output += f"\nExit Code: {result.returncode}"
+        if getattr(result, "timed_out", False):
+             output += "\nError: Command timed out after 120 seconds."
         return output
+    except subprocess.TimeoutExpired:
+        return "Error: Command timed out after 120 seconds."
     except Exception as e:
         return f"Docker Execution Error: {e}"
 
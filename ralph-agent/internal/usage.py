@@ -0,0 +1,82 @@
+import json
+import os
+import time
+from collections import defaultdict
+
+import config
+
+LOG_DIR = os.path.join(config.BASE_DIR, "logs")
+USAGE_FILE = os.path.join(LOG_DIR, "usage.jsonl")
+SUMMARY_FILE = os.path.join(LOG_DIR, "usage-summary.json")
+
+def get_run_id() -> str:
+    """Run id shared with sub-agent processes through the environment (set once by main)."""
+    run_id = os.environ.get("RALPH_RUN_ID")
+    if not run_id:
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        os.environ["RALPH_RUN_ID"] = run_id
+    return run_id
+
+def _estimate_cost(model: str, prompt_tokens: int, completion_tokens: int):
+    price = config.MODEL_PRICES.get(model)
+    if not price:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+def record_usage(completion, agent: str, step: int):
+    """Appends the usage of one chat completion to logs/usage.jsonl (safe across sub-agent processes)."""
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    # OpenRouter adds the billed cost when usage accounting is requested
+    cost = getattr(usage, "cost", None)
+    if cost is None:
+        cost = _estimate_cost(completion.model, usage.prompt_tokens, usage.completion_tokens)
+    entry = {
+        "run_id": get_run_id(),
+        "ts": time.time(),
+        "agent": agent,
+        "step": step,
+        "model": completion.model,
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+        "cost": cost,
+    }
+    os.makedirs(LOG_DIR, exist_ok=True)
+    # One short O_APPEND write per line keeps lines intact across processes
+    with open(USAGE_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+def write_summary(run_id: str = None) -> dict:
+    """Aggregates this run's entries per agent, step, model and in total into logs/usage-summary.json."""
+    run_id = run_id or get_run_id()
+    empty = lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost": 0.0}
+    total = empty()
+    groups = {"agent": defaultdict(empty), "step": defaultdict(empty), "model": defaultdict(empty)}
+
+    try:
+        with open(USAGE_FILE, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        entries = []
+
+    for entry in entries:
+        if entry.get("run_id") != run_id:
+            continue
+        # Sub-agents are named Subagent-<id>; steps are per agent
+        keys = {"agent": entry["agent"], "step": f"{entry['agent']}#{entry['step']}", "model": entry["model"]}
+        for bucket in [total] + [groups[g][k] for g, k in keys.items()]:
+            bucket["calls"] += 1
+            bucket["prompt_tokens"] += entry["prompt_tokens"]
+            bucket["completion_tokens"] += entry["completion_tokens"]
+            bucket["cached_tokens"] += entry["cached_tokens"]
+            bucket["cost"] += entry["cost"] or 0.0
+
+    summary = {"run_id": run_id, "total": total, **{f"by_{g}": dict(b) for g, b in groups.items()}}
+    tmp = SUMMARY_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp, SUMMARY_FILE)
+    return summary
@@ -1,12 +1,13 @@
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 from langgraph.types import Send
 
 from state import AgentState
 from nodes import (
+    compactor_node,
     manager_node, 
     manager_tools, 
     should_continue, 
+    next_iteration,
     dispatcher_node,
     dispatch_logic, # conditional edge
     worker_node,
@@ -20,6 +21,7 @@ def create_graph():
     workflow = StateGraph(AgentState)
     
     # 1. Add Nodes
+    workflow.add_node("compactor", compactor_node)
     workflow.add_node("manager", manager_node)
     workflow.add_node("dispatcher", dispatcher_node)
     workflow.add_node("worker", worker_node)
@@ -29,14 +31,17 @@ def create_graph():
     workflow.add_node("reducer", reduce_node)
     
     # 2. Add Edges
-    workflow.set_entry_point("manager")
+    # Compactor runs before every Manager turn (no-op while under budget)
+    workflow.set_entry_point("compactor")
+    workflow.add_edge("compactor", "manager")
     
-    # Manager -> Dispatcher or END
+    # Manager -> Dispatcher, next iteration (no tool calls) or END
     workflow.add_conditional_edges(
         "manager",
         should_continue,
         {
             "dispatch": "dispatcher",
+            "next": "compactor",
             END: END
         }
     )
@@ -54,7 +59,36 @@ def create_graph():
     workflow.add_edge("admin", "reducer")
     workflow.add_edge("research", "reducer")
     
-    # Reducer returns to END (Loop handled by main.py)
-    workflow.add_edge("reducer", END)
+    # Reducer -> next iteration, or END on git_commit / iteration limit
+    # The whole session is one graph run: state stays in the graph between supersteps
+    workflow.add_conditional_edges(
+        "reducer",
+        next_iteration,
+        {
+            "next": "compactor",
+            END: END
+        }
+    )
     
     return workflow.compile()
+
+# Supersteps per iteration: compactor, manager, dispatcher, branches, reducer
+STEPS_PER_ITERATION = 5
+
+def run_config(iteration: int, cap: int = 0, **config) -> dict:
+    """Run config for a session starting after `iteration` Manager turns, stopping after `cap` more (0 = no cap)."""
+    return {
+        **config,
+        "recursion_limit": (cap * STEPS_PER_ITERATION + 1) if cap else 1_000_000,
+        "configurable": {"iteration_limit": iteration + cap if cap else None},
+    }
+
+def ends_iteration(update: dict) -> bool:
+    """True for the `updates` stream chunk that completes an iteration (reducer, or a Manager turn without tool calls)."""
+    if "reducer" in update:
+        return True
+    manager = update.get("manager")
+    if not manager:
+        return False
+    last = manager["messages"][-1]
+    return not getattr(last, "tool_calls", None)
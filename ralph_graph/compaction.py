@@ -0,0 +1,116 @@
+import json
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from config import COMPACTION_KEEP_TURNS, COMPACTION_DIGEST_CHARS, COMPACTION_TOOL_RESULT_CHARS
+
+# Marks the HumanMessage that holds the digest so later compactions can fold it in
+DIGEST_FLAG = "ralph_digest"
+DIGEST_HEADER = (
+    "CONTEXT DIGEST: Earlier turns were compacted to save context. "
+    "Summary of the work done so far (oldest first):"
+)
+
+ARGS_PREVIEW_CHARS = 200
+RESULT_PREVIEW_CHARS = 300
+
+def _one_line(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def _head_length(messages: List[BaseMessage]) -> int:
+    """Leading system messages are the stable prompt and never compacted."""
+    i = 0
+    while i < len(messages) and isinstance(messages[i], SystemMessage):
+        i += 1
+    return i
+
+def is_digest(msg: BaseMessage) -> bool:
+    return isinstance(msg, HumanMessage) and msg.additional_kwargs.get(DIGEST_FLAG, False)
+
+def find_turn_boundaries(messages: List[BaseMessage], start: int) -> List[int]:
+    """
+    Returns the indexes (>= start) where the history can be cut without splitting
+    an AIMessage tool call from its ToolMessage(s). Strict providers reject orphans on either side.
+    """
+    open_calls = set()
+    boundaries = []
+    for i in range(start, len(messages)):
+        msg = messages[i]
+        if not open_calls and not isinstance(msg, ToolMessage):
+            boundaries.append(i)
+        if isinstance(msg, AIMessage):
+            open_calls.update(tc["id"] for tc in msg.tool_calls)
+        elif isinstance(msg, ToolMessage):
+            open_calls.discard(msg.tool_call_id)
+    return boundaries
+
+def _pick_cut(messages: List[BaseMessage], boundaries: List[int], keep_turns: int) -> Optional[int]:
+    """Latest boundary that still leaves `keep_turns` AIMessages after it."""
+    ai_indexes = [i for i, m in enumerate(messages) if isinstance(m, AIMessage)]
+    if len(ai_indexes) <= keep_turns:
+        return None
+    limit = ai_indexes[-keep_turns] if keep_turns > 0 else len(messages)
+    candidates = [b for b in boundaries if b <= limit]
+    return candidates[-1] if candidates else None
+
+def summarize_turns(messages: List[BaseMessage]) -> List[str]:
+    """Builds one digest line per manager action from the evicted messages."""
+    tool_results = {m.tool_call_id: m.content for m in messages if isinstance(m, ToolMessage)}
+    lines = []
+    for msg in messages:
+        if is_digest(msg):
+            # Fold the previous digest in, minus its header
+            lines.extend(line for line in msg.content.splitlines()[1:] if line)
+        elif isinstance(msg, AIMessage):
+            if msg.content:
+                lines.append(f"- Manager: {_one_line(msg.content, RESULT_PREVIEW_CHARS)}")
+            for tc in msg.tool_calls:
+                args = _one_line(json.dumps(tc.get("args", {}), ensure_ascii=False), ARGS_PREVIEW_CHARS)
+                result = _one_line(tool_results.get(tc["id"], "no result"), RESULT_PREVIEW_CHARS)
+                lines.append(f"- {tc['name']}({args}) -> {result}")
+    return lines
+
+def build_digest(lines: List[str], max_chars: int = COMPACTION_DIGEST_CHARS) -> HumanMessage:
+    """Digest message, dropping the oldest lines first when over `max_chars`."""
+    kept, size = [], 0
+    for line in reversed(lines):
+        if size + len(line) + 1 > max_chars:
+            kept.append("- (older entries dropped)")
+            break
+        kept.append(line)
+        size += len(line) + 1
+    body = "\n".join([DIGEST_HEADER] + list(reversed(kept)))
+    return HumanMessage(content=body, additional_kwargs={DIGEST_FLAG: True})
+
+def truncate_tool_results(messages: List[BaseMessage], max_chars: int = COMPACTION_TOOL_RESULT_CHARS) -> Tuple[List[BaseMessage], int]:
+    """Cuts oversized ToolMessages down to `max_chars`. Returns the new list and the number of cut messages."""
+    out, cut = [], 0
+    for msg in messages:
+        if isinstance(msg, ToolMessage) and isinstance(msg.content, str) and len(msg.content) > max_chars:
+            dropped = len(msg.content) - max_chars
+            content = f"{msg.content[:max_chars]}\n... [truncated {dropped} chars during context compaction]"
+            msg = msg.model_copy(update={"content": content})
+            cut += 1
+        out.append(msg)
+    return out, cut
+
+def compact_messages(messages: List[BaseMessage], keep_turns: int = COMPACTION_KEEP_TURNS) -> Tuple[List[BaseMessage], int]:
+    """
+    Replaces everything between the system prompt and the last `keep_turns` manager turns
+    with a single digest message. Returns the compacted history and the number of evicted messages.
+    """
+    head = _head_length(messages)
+    boundaries = find_turn_boundaries(messages, head)
+    cut = _pick_cut(messages, boundaries, keep_turns)
+    if cut is None or cut <= head:
+        return list(messages), 0
+
+    evicted = messages[head:cut]
+    if len(evicted) == 1 and is_digest(evicted[0]):
+        # Nothing new to fold in
+        return list(messages), 0
+
+    digest = build_digest(summarize_turns(evicted))
+    return list(messages[:head]) + [digest] + list(messages[cut:]), len(evicted)
@@ -5,12 +5,56 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+# OpenAI-compatible endpoint (point at bench/mock_openai.py for offline runs)
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 CONTEXT7_API_KEY = os.getenv("CONTEXT7_API_KEY")
 
 # Model Configuration
 RALPH_MODEL = os.getenv("RALPH_MODEL", "google/gemini-flash-1.5")
 SUBAGENT_MODEL = os.getenv("SUBAGENT_MODEL", RALPH_MODEL)
 
+# Fan-out Scheduling
+# Max concurrent LLM-backed branches (worker/admin/command/research) per model
+SUBAGENT_MAX_CONCURRENCY = int(os.getenv("RALPH_MAX_CONCURRENCY", "4"))
+# Per-model overrides, e.g. "chutes/devstral-2512=8,google/gemini-flash-1.5=2"
+MODEL_CONCURRENCY = {
+    model.strip(): int(limit)
+    for model, _, limit in (
+        item.rpartition("=") for item in os.getenv("RALPH_MODEL_CONCURRENCY", "").split(",") if "=" in item
+    )
+}
+# Requests per minute per model (0 = learn it from provider rate limit headers)
+SUBAGENT_RPM = float(os.getenv("RALPH_REQUESTS_PER_MINUTE", "0"))
+# Optional prices (USD per 1M prompt/completion tokens) used when the provider does not report the cost,
+# e.g. "google/gemini-flash-1.5=0.075/0.3,chutes/devstral-2512=0.1/0.3"
+MODEL_PRICES = {
+    model.strip(): tuple(float(p) for p in prices.split("/"))
+    for model, _, prices in (
+        item.rpartition("=") for item in os.getenv("RALPH_MODEL_PRICES", "").split(",") if "=" in item
+    )
+}
+
+# Stream the Manager response and start each delegated task as soon as its tool call is complete
+STREAM_DISPATCH = os.getenv("RALPH_STREAM_DISPATCH", "true").lower() == "true"
+
+# Prompt caching: "auto" adds cache_control breakpoints only for providers that need them (Anthropic, Gemini)
+PROMPT_CACHE_CONTROL = os.getenv("RALPH_PROMPT_CACHE_CONTROL", "auto").lower()
+
+# Token Accounting
+# Optional tiktoken encoding name (e.g. "o200k_base") to override the per-model guess
+TOKENIZER_ENCODING = os.getenv("RALPH_TOKENIZER_ENCODING")
+
+# Context Compaction
+TOKEN_LIMIT = int(os.getenv("RALPH_TOKEN_LIMIT", "20000"))
+# Compaction kicks in once the history reaches this fraction of TOKEN_LIMIT
+COMPACTION_TRIGGER = float(os.getenv("RALPH_COMPACTION_TRIGGER", "0.8"))
+# Number of most recent manager turns that are always kept verbatim
+COMPACTION_KEEP_TURNS = int(os.getenv("RALPH_COMPACTION_KEEP_TURNS", "3"))
+# Max size of the digest that replaces evicted turns
+COMPACTION_DIGEST_CHARS = int(os.getenv("RALPH_COMPACTION_DIGEST_CHARS", "6000"))
+# Tool results kept verbatim are cut to this size if compaction alone is not enough
+COMPACTION_TOOL_RESULT_CHARS = int(os.getenv("RALPH_COMPACTION_TOOL_RESULT_CHARS", "2000"))
+
 # Paths
 # Base dir of THIS module (ralph_graph)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -26,6 +70,71 @@ LEGACY_AGENT_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "ralph-agent"))
 
 WORKSPACE_DIR = get_abs_path("RALPH_WORKSPACE_DIR", os.path.join(LEGACY_AGENT_DIR, "workspace"))
 PROMPTS_DIR = get_abs_path("RALPH_PROMPTS_DIR", os.path.join(BASE_DIR, "prompts"))
+CHECKPOINT_DIR = get_abs_path("RALPH_CHECKPOINT_DIR", os.path.join(BASE_DIR, "checkpoints"))
+
+# Tracing: spans for graph nodes, LLM requests and tool calls, exported as JSONL (see trace_view.py)
+TRACE_ENABLED = os.getenv("RALPH_TRACE", "true").lower() == "true"
+TRACE_DIR = get_abs_path("RALPH_TRACE_DIR", os.path.join(BASE_DIR, "logs", "traces"))
+
+# Logging: records go through a queue to a background thread, the file log is JSON lines (logs/ralph.jsonl)
+LOG_LEVEL = os.getenv("RALPH_LOG_LEVEL", "INFO").upper()
+# Rotate the file log at this size, keeping LOG_BACKUPS old files
+LOG_MAX_MB = float(os.getenv("RALPH_LOG_MAX_MB", "20"))
+LOG_BACKUPS = int(os.getenv("RALPH_LOG_BACKUPS", "5"))
+# Keep 1 in N DEBUG records per call site (1 = keep all)
+LOG_DEBUG_SAMPLE = int(os.getenv("RALPH_LOG_DEBUG_SAMPLE", "10"))
+# Tool arguments / results are cut to this many characters in the log
+LOG_PAYLOAD_CHARS = int(os.getenv("RALPH_LOG_PAYLOAD_CHARS", "500"))
+
+# Warm daemon (daemon.py): control socket of the long-running process that keeps the compiled graph alive
+DAEMON_SOCKET = get_abs_path("RALPH_DAEMON_SOCKET", os.path.join(BASE_DIR, "ralph.sock"))
+
+# Iteration loop (runs inside the graph): stop a session after this many Manager turns without git_commit (0 = no cap)
+ITERATION_CAP = int(os.getenv("RALPH_ITERATION_CAP", "0"))
+
+# Checkpointing
+# Resume an interrupted run from the last checkpoint (cleared once a run ends with git_commit)
+RESUME_STATE = os.getenv("RALPH_RESUME", "true").lower() == "true"
+# Write a full snapshot every N journal records (bounds replay time)
+SNAPSHOT_EVERY = int(os.getenv("RALPH_SNAPSHOT_EVERY", "20"))
+
+# Message store: bodies of large tool results / human messages live once, compressed, in CHECKPOINT_DIR/messages
+# and the state only carries references to them (see message_store.py)
+MESSAGE_STORE = os.getenv("RALPH_MESSAGE_STORE", "true").lower() == "true"
+# Bodies shorter than this stay inline
+MESSAGE_STORE_MIN_CHARS = int(os.getenv("RALPH_MESSAGE_STORE_MIN_CHARS", "1024"))
+# In-memory LRU of decompressed bodies (materialized for every Manager request)
+MESSAGE_STORE_CACHE_MB = float(os.getenv("RALPH_MESSAGE_STORE_CACHE_MB", "8"))
+
+# run_command uses long-lived shell sessions in the workspace container instead of one `docker exec` per command
+PERSISTENT_SHELL = os.getenv("RALPH_PERSISTENT_SHELL", "true").lower() == "true"
+
+# Command output capture: outputs above OUTPUT_INLINE_LIMIT bytes (per stream) are spilled to
+# .ralph/logs/ in the workspace and summarized as head + tail + error lines
+OUTPUT_INLINE_LIMIT = int(os.getenv("RALPH_OUTPUT_INLINE_LIMIT", "16000"))
+OUTPUT_HEAD_BYTES = int(os.getenv("RALPH_OUTPUT_HEAD_BYTES", "3000"))
+OUTPUT_TAIL_LINES = int(os.getenv("RALPH_OUTPUT_TAIL_LINES", "60"))
+OUTPUT_MAX_ERROR_LINES = int(os.getenv("RALPH_OUTPUT_MAX_ERROR_LINES", "40"))
+# Only the most recent spilled output log files are kept (0 = keep all)
+OUTPUT_LOGS_KEEP = int(os.getenv("RALPH_OUTPUT_LOGS_KEEP", "100"))
+
+# Tool result budgets (tokens), applied by the reducer to what the Manager gets back:
+# per result (one tool call, or one worker task of a PlanTasks call) and for all results of one turn.
+# Results over budget are written to .ralph/results/ in the workspace and replaced by a digest with the path (0 = no budget)
+RESULT_CALL_TOKENS = int(os.getenv("RALPH_RESULT_CALL_TOKENS", "2500"))
+RESULT_TURN_TOKENS = int(os.getenv("RALPH_RESULT_TURN_TOKENS", "6000"))
+
+# Shared file content cache (read_file / list_dir)
+FILE_CACHE_MAX_MB = float(os.getenv("RALPH_FILE_CACHE_MAX_MB", "64"))
+
+# Context7
+CONTEXT7_BASE_URL = os.getenv("CONTEXT7_BASE_URL", "https://context7.com/api/v2")
+CONTEXT7_TIMEOUT = float(os.getenv("CONTEXT7_TIMEOUT", "20"))
+CONTEXT7_CACHE_DIR = get_abs_path("CONTEXT7_CACHE_DIR", os.path.join(BASE_DIR, "cache", "context7"))
+# Library id resolutions rarely change, docs are refreshed more often
+CONTEXT7_LIBRARY_TTL = int(os.getenv("CONTEXT7_LIBRARY_TTL", str(7 * 24 * 3600)))
+CONTEXT7_CONTEXT_TTL = int(os.getenv("CONTEXT7_CONTEXT_TTL", str(24 * 3600)))
+CONTEXT7_CACHE_MAX_MB = float(os.getenv("CONTEXT7_CACHE_MAX_MB", "50"))
 
 # Ensure workspace exists
 os.makedirs(WORKSPACE_DIR, exist_ok=True)
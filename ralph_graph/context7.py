@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import (
+    CONTEXT7_API_KEY,
+    CONTEXT7_BASE_URL,
+    CONTEXT7_TIMEOUT,
+    CONTEXT7_CACHE_DIR,
+    CONTEXT7_LIBRARY_TTL,
+    CONTEXT7_CONTEXT_TTL,
+    CONTEXT7_CACHE_MAX_MB,
+)
+from logger import logger
+
+class DiskCache:
+    """
+    Small JSON-file cache with per-entry TTL and LRU eviction by total size.
+    Each entry is one file; its mtime is the LRU clock (refreshed on every hit).
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(e.stat().st_size for e in os.scandir(directory) if e.name.endswith(".json"))
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires", 0) < time.time():
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("value")
+
+    def set(self, key: str, value: Any, ttl: int):
+        path = self._path(key)
+        data = json.dumps({"key": key, "expires": time.time() + ttl, "value": value}, separators=(",", ":"))
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._size += os.path.getsize(path) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: str):
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Drops least recently used entries until the cache is under 90% of its budget. Caller holds the lock."""
+        entries = sorted(
+            (e for e in os.scandir(self.directory) if e.name.endswith(".json")),
+            key=lambda e: e.stat().st_mtime
+        )
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._size <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except OSError:
+                continue
+
+class Context7Client:
+    """
+    Context7 API client with a pooled HTTP session, on-disk cache and coalescing
+    of identical in-flight requests (parallel research branches asking the same thing share one fetch).
+    """
+
+    def __init__(self, base_url: str = CONTEXT7_BASE_URL, api_key: Optional[str] = CONTEXT7_API_KEY,
+                 timeout: float = CONTEXT7_TIMEOUT, cache: Optional[DiskCache] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cache = cache or DiskCache(CONTEXT7_CACHE_DIR, int(CONTEXT7_CACHE_MAX_MB * 1024 * 1024))
+
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504], allowed_methods=["GET"])
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+    def _get_json(self, path: str, params: Dict[str, Any]) -> Any:
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _cached(self, key: str, ttl: int, fetch: Callable[[], Any]) -> Any:
+        """Cache lookup, then a single shared fetch per key across threads."""
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = fetch()
+            if value:
+                # Negative results are not cached
+                self.cache.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def resolve_library(self, library_name: str, query: str = "") -> Optional[Dict[str, Any]]:
+        """Returns the best matching library ({"id", "title"}) or None."""
+        def fetch():
+            data = self._get_json("/libs/search", {"libraryName": library_name, "query": query})
+            libraries = data.get("results", []) if isinstance(data, dict) else data
+            if not libraries:
+                return {}
+            best = libraries[0]
+            return {"id": best.get("id"), "title": best.get("title")}
+
+        match = self._cached(f"lib:{library_name.strip().lower()}", CONTEXT7_LIBRARY_TTL, fetch)
+        return match or None
+
+    def get_context(self, library_id: str, query: str) -> Dict[str, Any]:
+        """Returns the raw context response (codeSnippets / infoSnippets) for a library."""
+        def fetch():
+            return self._get_json("/context", {"libraryId": library_id, "query": query, "type": "json"})
+
+        return self._cached(f"ctx:{library_id}:{query.strip().lower()}", CONTEXT7_CONTEXT_TTL, fetch)
+
+    def search(self, query: str, library_name: str) -> str:
+        """Resolves the library and formats its documentation snippets for the agent."""
+        library = self.resolve_library(library_name, query)
+        if not library:
+            return f"Context7: No library found for '{library_name}'."
+        library_id, library_real_name = library.get("id"), library.get("title")
+        if not library_id:
+            return f"Context7: Invalid library data found for '{library_name}'."
+
+        c_data = self.get_context(library_id, query)
+        code_snippets = c_data.get("codeSnippets", [])
+        info_snippets = c_data.get("infoSnippets", [])
+
+        if not code_snippets and not info_snippets:
+            return f"Context7: Found library '{library_real_name}' but no documentation returned for query '{query}'."
+
+        output = [f"--- Context7 Results for '{library_real_name}' ---"]
+
+        for snippet in code_snippets:
+            title = snippet.get("codeTitle", "Untitled")
+            desc = snippet.get("codeDescription", "")
+            output.append(f"\nTitle: {title}\nDescription: {desc}")
+
+            for code_item in snippet.get("codeList", []):
+                lang = code_item.get("language", "")
+                code = code_item.get("code", "")
+                output.append(f"Code ({lang}):\n{code}")
+
+        for snippet in info_snippets:
+            title = snippet.get("title", "Untitled")
+            content = snippet.get("content", "")
+            output.append(f"\nTitle: {title}\nContent: {content}")
+
+        return "\n".join(output)
+
+_client: Optional[Context7Client] = None
+_client_lock = threading.Lock()
+
+def get_context7_client() -> Context7Client:
+    """Returns the process-wide Context7 client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            logger.info(f"Initializing Context7 client ({CONTEXT7_BASE_URL}).")
+            _client = Context7Client()
+        return _client
@@ -0,0 +1,86 @@
+"""
+Local stand-in for the Context7 API, for exercising context7.py offline.
+
+Usage:
+    python -m ralph_graph.context7_stub --port 8765 --latency 0.2
+    CONTEXT7_BASE_URL=http://127.0.0.1:8765/api/v2 python -m ralph_graph.main
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+def _library_id(name: str) -> str:
+    slug = "".join(c if c.isalnum() else "-" for c in name.lower()).strip("-")
+    return f"/stub/{slug}"
+
+class StubContext7Handler(BaseHTTPRequestHandler):
+    """Serves /api/v2/libs/search and /api/v2/context with canned data."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        server = self.server
+        with server.lock:
+            server.hits[url.path] = server.hits.get(url.path, 0) + 1
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if url.path.endswith("/libs/search"):
+            name = params.get("libraryName", "")
+            if name.lower() in server.unknown_libraries:
+                body = {"results": []}
+            else:
+                body = {"results": [{"id": _library_id(name), "title": name}]}
+        elif url.path.endswith("/context"):
+            library_id = params.get("libraryId", "")
+            query = params.get("query", "")
+            body = {
+                "codeSnippets": [{
+                    "codeTitle": f"{query} example",
+                    "codeDescription": f"Stub snippet for {library_id}",
+                    "codeList": [{"language": "js", "code": f"// {query}\nconsole.log('{library_id}');"}]
+                }],
+                "infoSnippets": [{"title": "Overview", "content": f"Stub documentation for '{query}'."}]
+            }
+        elif url.path == "/stats":
+            body = server.hits
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port: int = 0, latency: float = 0.0, unknown_libraries=()) -> ThreadingHTTPServer:
+    """Starts the stub in a daemon thread. Returns the server (`server.server_port`, `server.hits`)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubContext7Handler)
+    server.latency = latency
+    server.unknown_libraries = {name.lower() for name in unknown_libraries}
+    server.hits = {}
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline Context7 stub server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Artificial delay per request (seconds)")
+    args = parser.parse_args()
+
+    stub = start_stub_server(args.port, args.latency)
+    print(f"Context7 stub listening on http://127.0.0.1:{stub.server_port}/api/v2")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.shutdown()
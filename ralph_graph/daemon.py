@@ -0,0 +1,177 @@
+"""
+Warm daemon: one long-running process that keeps the compiled graph, the HTTP clients and the caches
+in memory, so loop.sh does not re-import LangChain / LangGraph and rebuild everything for every iteration.
+
+Usage:
+    python -m ralph_graph.daemon serve     # start the daemon (foreground)
+    python -m ralph_graph.daemon run       # run one session, like `python -m ralph_graph.main`, and wait for it
+    python -m ralph_graph.daemon status
+    python -m ralph_graph.daemon stop      # cancels a running session (progress stays in the checkpoint journal)
+
+Protocol: one JSON request line ({"cmd": "run" | "status" | "stop"}) and one JSON response line per connection,
+over the Unix socket at RALPH_DAEMON_SOCKET.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Only config here: the client commands must stay cheap to start
+from config import DAEMON_SOCKET
+
+class RalphDaemon:
+    """Serves run / status / stop requests. Sessions run one at a time, each with the isolation of a fresh main.py run."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.app = None
+        self.session = None
+        self.session_started = None
+        self.sessions = 0
+        self.last = None
+        self.started_at = time.time()
+        self._stop = None
+
+    async def serve(self):
+        # The expensive part, paid once per daemon instead of once per iteration
+        from app import create_graph
+        from logger import logger
+
+        if os.path.exists(self.path):
+            try:
+                request("status", self.path, timeout=2)
+                sys.exit(f"A daemon is already listening on {self.path}")
+            except OSError:
+                os.unlink(self.path)  # stale socket of a dead daemon
+
+        self.app = create_graph()
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self._stop.set)
+
+        server = await asyncio.start_unix_server(self.handle, path=self.path)
+        logger.info(f"Ralph daemon listening on {self.path} (pid {os.getpid()})")
+        try:
+            await self._stop.wait()
+        finally:
+            await self._cancel_session()
+            server.close()
+            await server.wait_closed()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            logger.info("Ralph daemon stopped.")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            line = await reader.readline()
+            cmd = json.loads(line or b"{}").get("cmd")
+            if cmd == "run":
+                response = await self.run()
+            elif cmd == "status":
+                response = self.status()
+            elif cmd == "stop":
+                response = {"ok": True, "cancelled_session": await self._cancel_session()}
+                self._stop.set()
+            else:
+                response = {"ok": False, "error": f"Unknown command: {cmd}"}
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        try:
+            writer.write((json.dumps(response, default=str) + "\n").encode())
+            await writer.drain()
+            writer.close()
+        except ConnectionError:
+            pass  # client went away (e.g. Ctrl+C on `run`); the session result is still in `status`
+
+    async def run(self) -> dict:
+        from main import run_session
+        from logger import logger
+
+        if self.session and not self.session.done():
+            return {"ok": False, "error": "A session is already running"}
+        self.session = asyncio.create_task(run_session(self.app))
+        self.session_started = time.time()
+        error = None
+        try:
+            outcome = await self.session
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+        except Exception as e:
+            # A failed session must not take the daemon (and its warm state) down
+            outcome, error = "error", f"{type(e).__name__}: {e}"
+            logger.exception("Session failed")
+        self.sessions += 1
+        self.last = {
+            "outcome": outcome,
+            "error": error,
+            "seconds": round(time.time() - self.session_started, 3),
+            "finished_at": time.time(),
+        }
+        return {"ok": outcome != "error", **self.last}
+
+    def status(self) -> dict:
+        from file_cache import file_cache
+        from usage import usage_ledger
+
+        running = bool(self.session and not self.session.done())
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "state": "running" if running else "idle",
+            "uptime": round(time.time() - self.started_at, 1),
+            "sessions": self.sessions,
+            "session_seconds": round(time.time() - self.session_started, 1) if running else None,
+            "last": self.last,
+            "usage": usage_ledger.summary()["total"],
+            "file_cache": file_cache.stats(),
+        }
+
+    async def _cancel_session(self) -> bool:
+        if not self.session or self.session.done():
+            return False
+        self.session.cancel()
+        try:
+            await self.session
+        except (asyncio.CancelledError, Exception):
+            pass
+        return True
+
+def request(cmd: str, path: str = DAEMON_SOCKET, timeout: float = None) -> dict:
+    """Sends one command to the daemon and returns its response (OSError if no daemon is listening)."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall((json.dumps({"cmd": cmd}) + "\n").encode())
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    if not data:
+        raise ConnectionError("Daemon closed the connection without a response")
+    return json.loads(data)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm ralph_graph daemon")
+    parser.add_argument("command", choices=["serve", "run", "status", "stop"])
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help="Control socket path")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        asyncio.run(RalphDaemon(args.socket).serve())
+        sys.exit(0)
+
+    try:
+        # `run` lasts as long as the session
+        response = request(args.command, args.socket, timeout=None if args.command == "run" else 10)
+    except OSError as e:
+        sys.exit(f"Ralph daemon not reachable on {args.socket}: {e}")
+    print(json.dumps(response, indent=2))
+    sys.exit(0 if response.get("ok") else 1)
@@ -0,0 +1,82 @@
+import asyncio
+import json
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from logger import logger
+
+class InflightTasks:
+    """
+    Branch work started while the Manager is still streaming its response.
+    The Manager starts a task under the key the branch node will later receive (task_id / tool_call_id),
+    and the branch node claims it instead of running the work a second time.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.claimed = 0
+
+    def start(self, key: str, coro: Awaitable):
+        if key in self._tasks:
+            coro.close()
+            return
+        self._tasks[key] = asyncio.ensure_future(coro)
+        self.started += 1
+
+    async def claim_or_run(self, key: str, factory: Callable[[], Awaitable]):
+        """Awaits the early task for `key` if there is one, otherwise runs `factory()` now."""
+        task = self._tasks.pop(key, None)
+        if task is None:
+            return await factory()
+        self.claimed += 1
+        return await task
+
+    def cancel_all(self):
+        """Drops tasks nobody claimed (e.g. the previous run failed between Manager and branches)."""
+        for key, task in self._tasks.items():
+            logger.warning(f"Cancelling unclaimed early task {key}.")
+            task.cancel()
+        self._tasks.clear()
+
+    def reset_stats(self):
+        self.started = 0
+        self.claimed = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"started": self.started, "claimed": self.claimed, "pending": len(self._tasks)}
+
+inflight = InflightTasks()
+
+class ToolCallTracker:
+    """
+    Follows the tool call chunks of a streamed AIMessageChunk and reports each call once
+    its arguments are complete: when the next call starts, or when the stream ends.
+    """
+
+    def __init__(self):
+        self.reported = set()
+
+    def _parse(self, chunk) -> Optional[dict]:
+        try:
+            args = json.loads(chunk.get("args") or "{}")
+        except json.JSONDecodeError:
+            return None
+        if not chunk.get("id") or not chunk.get("name") or not isinstance(args, dict):
+            return None
+        return {"name": chunk["name"], "args": args, "id": chunk["id"]}
+
+    def completed(self, message, final: bool = False) -> List[dict]:
+        chunks = [c for c in (message.tool_call_chunks or []) if c.get("index") is not None]
+        if not chunks:
+            return []
+        last_index = max(c["index"] for c in chunks)
+        done = []
+        for chunk in chunks:
+            index = chunk["index"]
+            if index in self.reported or (index == last_index and not final):
+                continue
+            self.reported.add(index)
+            call = self._parse(chunk)
+            if call:
+                done.append(call)
+        return done
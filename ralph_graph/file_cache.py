@@ -0,0 +1,127 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+
+from config import FILE_CACHE_MAX_MB
+
+class FileContentCache:
+    """
+    Process-wide cache for file contents and directory listings.
+    Entries are keyed by path and validated against (mtime_ns, size) on every lookup,
+    so external modifications (e.g. by commands in the container) are picked up.
+    Bounded by total bytes with LRU eviction; concurrent identical reads share one fetch.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[tuple, object, int]]" = OrderedDict()
+        self._size = 0
+        self._inflight: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_or_load(self, key: str, signature: tuple, load: Callable[[], object], size_of: Callable[[object], int]):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            inflight_key = (key, signature)
+            future = self._inflight.get(inflight_key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = Future()
+                self._inflight[inflight_key] = future
+            else:
+                # Someone else is already reading this exact version
+                self.hits += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = load()
+        except BaseException as e:
+            future.set_exception(e)
+            with self._lock:
+                self._inflight.pop(inflight_key, None)
+            raise
+
+        with self._lock:
+            self._store(key, signature, value, size_of(value))
+            self._inflight.pop(inflight_key, None)
+        future.set_result(value)
+        return value
+
+    def _store(self, key: str, signature: tuple, value, size: int):
+        """Caller holds the lock."""
+        old = self._entries.pop(key, None)
+        if old:
+            self._size -= old[2]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (signature, value, size)
+        self._size += size
+        while self._size > self.max_bytes and self._entries:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+            self.evictions += 1
+
+    def read_text(self, path: str) -> str:
+        """Reads a UTF-8 file through the cache. `path` must already be validated."""
+        st = os.stat(path)
+
+        def load():
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+
+        return self._get_or_load(f"file:{path}", (st.st_mtime_ns, st.st_size), load, len)
+
+    def list_dir(self, path: str) -> List[str]:
+        """Lists a directory through the cache (a directory's mtime changes when entries are added/removed)."""
+        st = os.stat(path)
+        return self._get_or_load(
+            f"dir:{path}",
+            (st.st_mtime_ns, st.st_nlink),
+            lambda: os.listdir(path),
+            lambda names: sum(len(n) for n in names) + 64 * len(names)
+        )
+
+    def invalidate(self, path: str):
+        """Drops the cached file and its parent directory listing (called after writes)."""
+        with self._lock:
+            for key in (f"file:{path}", f"dir:{os.path.dirname(path)}"):
+                entry = self._entries.pop(key, None)
+                if entry:
+                    self._size -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def reset_stats(self):
+        """Counters only; cached files stay warm for the next session."""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+file_cache = FileContentCache(int(FILE_CACHE_MAX_MB * 1024 * 1024))
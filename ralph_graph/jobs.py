@@ -0,0 +1,173 @@
+import atexit
+import itertools
+import os
+import re
+import shlex
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import WORKSPACE_DIR
+from logger import logger
+from ralph_dir import RALPH_DIR, ralph_path
+
+# Relative to WORKSPACE_DIR (shared with the container at the same path)
+JOBS_DIR = os.path.join(RALPH_DIR, "jobs")
+POLL_INTERVAL = 0.5
+KILL_GRACE_SECONDS = 3
+
+class Job:
+    def __init__(self, job_id: str, command: str, pid: str):
+        self.job_id = job_id
+        self.command = command
+        self.pid = pid
+        self.started_at = time.time()
+        self.log_path = os.path.join(JOBS_DIR, f"{job_id}.log")
+        self.exit_path = os.path.join(JOBS_DIR, f"{job_id}.exit")
+        self.killed = False
+
+    def abs(self, rel_path: str) -> str:
+        return os.path.join(WORKSPACE_DIR, rel_path)
+
+class JobRegistry:
+    """
+    Background processes in the workspace container.
+    Each job runs in its own session (process group) with output redirected to `.ralph/jobs/<id>.log`
+    and its exit code written to `.ralph/jobs/<id>.exit`, both readable from the host.
+    """
+
+    def __init__(self, exec_prefix: List[str]):
+        self.exec_prefix = exec_prefix
+        self.jobs: Dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        atexit.register(self.reap_all)
+
+    def _exec(self, script: str, timeout: float = 30) -> subprocess.CompletedProcess:
+        return subprocess.run(self.exec_prefix + ["/bin/sh", "-c", script], capture_output=True, text=True, timeout=timeout)
+
+    def get(self, job_id: str) -> Job:
+        job = self.jobs.get(job_id)
+        if job is None:
+            known = ", ".join(self.jobs) or "none"
+            raise KeyError(f"Unknown job '{job_id}'. Known jobs: {known}")
+        return job
+
+    def start(self, command: str) -> Job:
+        with self._lock:
+            job_id = f"job-{next(self._ids)}"
+        # Job logs and exit files are scratch data, ignored by git_commit
+        ralph_path("jobs")
+        job = Job(job_id, command, pid="")
+
+        # setsid: the job leads its own process group so kill reaches the whole tree
+        wrapper = 'sh -c "$1"; echo $? > "$2"'
+        script = (
+            f"setsid sh -c {shlex.quote(wrapper)} _ {shlex.quote(command)} {shlex.quote(job.abs(job.exit_path))} "
+            f"> {shlex.quote(job.abs(job.log_path))} 2>&1 < /dev/null & echo $!"
+        )
+        result = self._exec(script)
+        if result.returncode != 0 or not result.stdout.strip():
+            raise RuntimeError(f"Failed to start job: {result.stderr.strip()}")
+
+        job.pid = result.stdout.strip().splitlines()[-1]
+        self.jobs[job_id] = job
+        logger.info(f"Started background job {job_id} (pid {job.pid}): {command}")
+        return job
+
+    def exit_code(self, job: Job) -> Optional[int]:
+        try:
+            with open(job.abs(job.exit_path), "r") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def is_running(self, job: Job) -> bool:
+        if job.killed or self.exit_code(job) is not None:
+            return False
+        return self._exec(f"kill -0 {job.pid} 2>/dev/null", timeout=10).returncode == 0
+
+    def status(self, job_id: str) -> str:
+        job = self.get(job_id)
+        uptime = int(time.time() - job.started_at)
+        if self.is_running(job):
+            state = "running"
+        elif job.killed:
+            state = "killed"
+        else:
+            code = self.exit_code(job)
+            state = f"exited with code {code}" if code is not None else "not running"
+        return f"{job_id} (pid {job.pid}): {state}, started {uptime}s ago. Command: {job.command}. Log: {job.log_path}"
+
+    def tail(self, job_id: str, lines: int = 50) -> str:
+        """Last `lines` lines of the job log, read from the end of the file."""
+        job = self.get(job_id)
+        path = job.abs(job.log_path)
+        if not os.path.exists(path):
+            return ""
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            block, data = 8192, b""
+            while end > 0 and data.count(b"\n") <= lines:
+                start = max(0, end - block)
+                f.seek(start)
+                data = f.read(end - start) + data
+                end = start
+        return b"\n".join(data.splitlines()[-lines:]).decode("utf-8", "replace")
+
+    def wait_ready(self, job_id: str, port: int = 0, log_pattern: str = "", timeout: float = 60) -> str:
+        """Waits until the job listens on `port` and/or its log matches `log_pattern`."""
+        job = self.get(job_id)
+        regex = re.compile(log_pattern) if log_pattern else None
+        path = job.abs(job.log_path)
+        offset, carry = 0, b""
+        port_ok, log_ok = not port, regex is None
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            if not log_ok and os.path.exists(path):
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    data = f.read()
+                offset += len(data)
+                # Keep a partial last line so a match split across reads is still found
+                text = (carry + data).decode("utf-8", "replace")
+                log_ok = bool(regex.search(text))
+                carry = (carry + data)[-4096:]
+            if not port_ok:
+                port_ok = self._exec(f"nc -z 127.0.0.1 {int(port)}", timeout=10).returncode == 0
+            if port_ok and log_ok:
+                return f"{job_id} is ready after {int(time.time() - job.started_at)}s."
+            if not self.is_running(job):
+                return f"{job_id} stopped before becoming ready.\n{self.status(job_id)}\nLast output:\n{self.tail(job_id, 30)}"
+            time.sleep(POLL_INTERVAL)
+
+        return f"{job_id} not ready after {timeout}s (still running: {self.is_running(job)}).\nLast output:\n{self.tail(job_id, 30)}"
+
+    def kill(self, job_id: str) -> str:
+        job = self.get(job_id)
+        if not self.is_running(job):
+            return self.status(job_id)
+        # Negative pid = whole process group
+        self._exec(f"kill -TERM -{job.pid} 2>/dev/null", timeout=10)
+        deadline = time.monotonic() + KILL_GRACE_SECONDS
+        while time.monotonic() < deadline and self.is_running(job):
+            time.sleep(0.2)
+        if self.is_running(job):
+            self._exec(f"kill -KILL -{job.pid} 2>/dev/null", timeout=10)
+        job.killed = True
+        logger.info(f"Killed background job {job_id}.")
+        return f"{job_id} (pid {job.pid}) killed."
+
+    def reap_all(self):
+        """Kills every job that is still running (called when the loop exits)."""
+        for job_id, job in list(self.jobs.items()):
+            try:
+                if not job.killed and self.exit_code(job) is None:
+                    self.kill(job_id)
+            except Exception as e:
+                logger.warning(f"Failed to reap {job_id}: {e}")
+
+job_registry = JobRegistry(exec_prefix=["docker", "exec", "-w", WORKSPACE_DIR, "ralph-workspace"])
@@ -1,36 +1,113 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import reprlib
 import sys
-from config import BASE_DIR
+import threading
+from collections import defaultdict
+from config import BASE_DIR, LOG_LEVEL, LOG_MAX_MB, LOG_BACKUPS, LOG_DEBUG_SAMPLE, LOG_PAYLOAD_CHARS
 
 LOGS_DIR = os.path.join(BASE_DIR, "logs")
 os.makedirs(LOGS_DIR, exist_ok=True)
 
-def setup_logger(name="ralph_graph", level=logging.INFO):
-    """Configures and returns a logger instance."""
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; structured fields come from `extra={"fields": {...}}`."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keeps the first and then every `rate`-th DEBUG record per call site; other levels always pass."""
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = max(1, rate)
+        self._seen = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate == 1:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            seen = self._seen[key]
+            self._seen[key] = seen + 1
+        return seen % self.rate == 0
+
+_repr = reprlib.Repr()
+_repr.maxstring = LOG_PAYLOAD_CHARS
+_repr.maxother = LOG_PAYLOAD_CHARS
+_repr.maxlist = _repr.maxtuple = _repr.maxdict = 20
+
+class Truncated:
+    """
+    Log argument that renders at most `limit` characters of `value`, only when the record is formatted.
+    Strings are sliced, anything else goes through reprlib, so a large payload is never stringified in full.
+    """
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit: int = LOG_PAYLOAD_CHARS):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        if isinstance(self.value, str):
+            if len(self.value) <= self.limit:
+                return self.value
+            return f"{self.value[:self.limit]}... [{len(self.value) - self.limit} more chars]"
+        return _repr.repr(self.value)
+
+def setup_logger(name="ralph_graph", level=LOG_LEVEL):
+    """
+    Configures and returns a logger instance.
+    Callers only enqueue records (QueueHandler); a QueueListener thread writes them to the
+    rotating JSON-lines file and to stdout, so handler I/O and locks stay off the worker threads.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    
+
     # Avoid adding handlers multiple times if already configured
     if logger.hasHandlers():
         return logger
 
-    # Formatter
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
+    # File Handler (JSON lines, size-based rotation)
+    log_file = os.path.join(LOGS_DIR, "ralph.jsonl")
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=int(LOG_MAX_MB * 1024 * 1024), backupCount=LOG_BACKUPS, encoding="utf-8"
     )
-
-    # File Handler
-    log_file = os.path.join(LOGS_DIR, "ralph.log")
-    file_handler = logging.FileHandler(log_file, encoding="utf-8")
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    file_handler.setFormatter(JsonFormatter())
 
     # Console Handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    console_handler.setFormatter(logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    ))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Dropped records are never formatted or enqueued
+    queue_handler.addFilter(SamplingFilter(LOG_DEBUG_SAMPLE))
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    # Drains the queue before logging's own shutdown closes the handlers
+    atexit.register(listener.stop)
 
     return logger
 
@@ -34,6 +34,27 @@ echo "Initializing Workspace..."
 # We run as a module so imports work
 python -m ralph_graph.startup
 
+# Warm daemon mode (RALPH_DAEMON=true): one process keeps the compiled graph, clients and caches
+# alive, and every iteration is a `daemon run` request instead of a fresh interpreter
+RUN_CMD="python -m ralph_graph.main"
+if [ "${RALPH_DAEMON:-false}" = "true" ]; then
+    if ! python -m ralph_graph.daemon status > /dev/null 2>&1; then
+        echo "Starting Ralph daemon..."
+        python -m ralph_graph.daemon serve &
+        DAEMON_PID=$!
+        # Only stop the daemon we started
+        trap 'python -m ralph_graph.daemon stop > /dev/null 2>&1' EXIT
+        until python -m ralph_graph.daemon status > /dev/null 2>&1; do
+            if ! kill -0 "$DAEMON_PID" 2>/dev/null; then
+                echo "Error: Ralph daemon failed to start."
+                exit 1
+            fi
+            sleep 0.5
+        done
+    fi
+    RUN_CMD="python -m ralph_graph.daemon run"
+fi
+
 while true; do
     # Check iteration limit
     if [ "$MAX_ITERATIONS" -gt 0 ] && [ "$ITERATION" -ge "$MAX_ITERATIONS" ]; then
@@ -45,7 +66,7 @@ while true; do
     echo "Running Ralph Graph (Iteration $((ITERATION+1)))"
     echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
     
-    python -m ralph_graph.main
+    $RUN_CMD
     
     ITERATION=$((ITERATION + 1))
 done
@@ -1,123 +1,147 @@
+import asyncio
 import os
 import sys
-import tiktoken
-from langchain_core.messages import SystemMessage, AIMessage
+from contextlib import ExitStack
+from langgraph.graph import END
 from termcolor import colored
 
 # Add current dir to path to find local modules if needed
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import create_graph
-from config import PROMPTS_DIR
+from app import create_graph, run_config, ends_iteration
+from config import RESUME_STATE, ITERATION_CAP
+from file_cache import file_cache
+from early_dispatch import inflight
+from jobs import job_registry
+from prompt_cache import build_system_message, cache_telemetry
 from logger import logger
-from state_manager import load_state, save_state
+from message_store import message_store
+from result_budget import result_budget
+from nodes import next_iteration
+from scheduler import scheduler_metrics, reset_scheduler_metrics
+from state_manager import CheckpointJournal
+from token_ledger import count_message_tokens
+from tools import shell_sessions
+from tracing import span
+from usage import usage_ledger
 
-def main():
+async def run_session(app) -> str:
+    """
+    Runs the agent loop on a compiled graph until the Manager calls git_commit (or RALPH_ITERATION_CAP is hit).
+    Returns "committed", "capped", "interrupted" or "failed" (missing prompt). Used by main() and by the daemon (daemon.py),
+    which keeps `app` and the process-wide clients / caches alive between sessions.
+    """
     logger.info(colored("Initializing Ralph Graph Agent Loop...", "cyan"))
+    # Per-session accounting (a daemon runs many sessions in one process)
+    usage_ledger.reset()
+    cache_telemetry.reset()
+    reset_scheduler_metrics()
+    inflight.reset_stats()
+    result_budget.reset_stats()
+    message_store.reset_stats()
+    file_cache.reset_stats()
     
     # 1. Load or Initialize State
-    # state = load_state() 
-    state = None # Force fresh start
+    journal = CheckpointJournal()
+    state = journal.load() if RESUME_STATE else None
     
     if not state:
-        # logger.info("No existing state found. Starting fresh.")
-        logger.info("Initializing fresh state (Persistence Disabled).")
-        # Load Initial Prompt
-        build_prompt_path = os.path.join(PROMPTS_DIR, "build.md")
+        logger.info("No checkpoint found. Initializing fresh state.")
+        journal.clear()
+        # Load Initial Prompt (build.md + AGENTS.md + plan as one cache-friendly prefix)
         try:
-            with open(build_prompt_path, "r") as f:
-                build_prompt = f.read()
-        except FileNotFoundError:
-            logger.error(f"Error: Could not find build prompt at {build_prompt_path}")
-            return
+            system_message = build_system_message("build.md")
+        except FileNotFoundError as e:
+            logger.error(f"Error: {e}")
+            return "failed"
 
+        initial_messages = [system_message]
         state = {
-            "messages": [SystemMessage(content=build_prompt)],
+            "messages": initial_messages,
+            "token_count": count_message_tokens(initial_messages),
             "pending_tasks": [],
             "results": {},
             "iteration": 0
         }
-    # else:
-    #     logger.info("Resuming from previous state.")
+    else:
+        logger.info(f"Resuming from checkpoint (iteration {state.get('iteration', 0)}, {len(state['messages'])} messages).")
+
+    # 2. Execution Loop
+    # The manager -> dispatcher -> reducer cycle loops inside the graph (see app.py). The stream yields
+    # each superstep's updates and the resulting state, so per-iteration bookkeeping happens here
+    # without passing the whole history back in for every Manager turn.
+    config = run_config(state.get("iteration", 0), ITERATION_CAP)
+    iteration = ExitStack()
+
+    def start_iteration():
+        number = state.get("iteration", 0) + 1
+        # Running total maintained by the nodes (see token_ledger.py)
+        logger.info(colored(f"Context Length: {state.get('token_count', 0)} tokens", "yellow"))
+        logger.info(colored(f"--- Iteration {number} ---", "blue"))
+        usage_ledger.iteration = number
+        # Root span of this iteration's trace (see trace_view.py).
+        # Nodes started by the stream from here on run in this context.
+        iteration.enter_context(span("iteration", "iteration", iteration=number))
+
+    def finish_iteration():
+        iteration.close()
+        # Checkpoint (appends only the messages added this iteration)
+        journal.record(state)
+
+        for metrics in scheduler_metrics().values():
+            logger.info(f"Scheduler: {metrics}")
+        logger.info(f"File cache: {file_cache.stats()}")
+        logger.info(f"Message store: {message_store.stats()}")
+        logger.info(f"Result budget: {result_budget.stats()}")
+        logger.info(f"Early dispatch: {inflight.stats()}")
+        logger.info(f"Prompt cache: {cache_telemetry.summary()}")
+        usage_ledger.flush()
+        logger.info(f"Usage (run): {usage_ledger.summary()['total']}")
 
-    # 2. Create the graph
-    app = create_graph()
-    
-    # 3. Execution Loop
     try:
-        while True:
-            current_iter = state.get("iteration", 0)
-            
-            # --- Context Length Logging ---
-            try:
-                enc = tiktoken.encoding_for_model("gpt-4")
-                # Estimate token count from messages
-                # Simple approximation: content of all messages
-                all_text = ""
-                for msg in state["messages"]:
-                    all_text += msg.content + "\n"
-                token_count = len(enc.encode(all_text))
-                logger.info(colored(f"Context Length: {token_count} tokens", "yellow"))
-            except Exception as e:
-                logger.warning(f"Failed to calculate token count: {e}")
-            # ------------------------------
+        start_iteration()
+        finished = False
+        async for mode, chunk in app.astream(state, config=config, stream_mode=["updates", "values"]):
+            if mode == "updates":
+                finished = finished or ends_iteration(chunk)
+                continue
+            state = chunk
+            if finished:
+                finished = False
+                finish_iteration()
+                if next_iteration(state, config) != END:
+                    start_iteration()
+
+        if next_iteration(state, {}) == END:
+            logger.info(colored("✅ 'git_commit' detected. Job Complete. Exiting Loop.", "green"))
+            # Run finished: the next loop.sh iteration starts fresh
+            journal.clear()
+            return "committed"
+        # Iteration cap: the next session resumes from the journal
+        logger.warning(f"Reached RALPH_ITERATION_CAP ({ITERATION_CAP}) without git_commit. Progress is kept in the checkpoint journal.")
+        return "capped"
 
-            logger.info(colored(f"--- Iteration {current_iter + 1} ---", "blue"))
-            
-            # Run one pass of the DAG
-            # invoke returns the final state of the graph
-            result = app.invoke(state)
-            
-            # Validate result (Graph might return partial state updates, but StateGraph usually returns full state)
-            state = result
-            state["iteration"] = current_iter + 1 # Iteration is updated in state, but we don't need to check it for termination
-            
-            # Save state - DISABLED per user request (State maintained in memory)
-            # save_state(state)
-            
-            # Explicitly clear transient state for the next turn
-            # This is crucial because standard graph merges might not clear old results if we don't have reducers for them.
-            state["results"] = {}
-            state["pending_tasks"] = []
-            
-            # Check for termination condition: git_commit
-            messages = state["messages"]
-            if messages:
-                last_msg = messages[-1]
-                # Check for git_commit in ALL messages of this turn? 
-                # Ideally, the Manager called it.
-                # If Manager called it, it would be in the last AIMessage, 
-                # OR in the history if we just finished a tool execution step.
-                # Actually, our DAG ends after Dispatch/Tool Execution.
-                # So if Manager called `git_commit`, the Dispatcher executed it.
-                # The Dispatcher returned, loop ended.
-                # So we verify if `git_commit` was in the executed tools.
-                
-                # We can check the last AIMessage for tool_calls with name 'git_commit'
-                # And confirm we aren't waiting for results (DAG finished).
-                
-                # Scan backwards for the last AIMessage
-                for msg in reversed(messages):
-                    if isinstance(msg, AIMessage) and msg.tool_calls:
-                        for tc in msg.tool_calls:
-                            if tc["name"] == "git_commit":
-                                logger.info(colored("✅ 'git_commit' detected. Job Complete. Exiting Loop.", "green"))
-                                return
-                        break # Only check the most recent AI turn
-            
-            # Optional: Add a safety break (max iterations)
-            # REMOVED per user request
-            # if state["iteration"] > 50:
-            #      logger.warning("Reached max iterations (50). Stopping.")
-            #      break
-                 
     except KeyboardInterrupt:
-        logger.info("🛑 User interrupted execution.")
-        # save_state(state)
+        logger.info("🛑 User interrupted execution. Progress is kept in the checkpoint journal.")
+        return "interrupted"
+    except asyncio.CancelledError:
+        # Daemon stop: same as an interrupt, the journal has every finished iteration
+        logger.info("🛑 Session cancelled. Progress is kept in the checkpoint journal.")
+        raise
     except Exception as e:
         logger.error(f"❌ Loop Error: {e}")
-        # save_state(state)
         raise e
+    finally:
+        iteration.close()
+        # Early-dispatched work, background jobs (dev servers etc.) and shell sessions must not outlive the session:
+        # the next one (in the daemon) starts with fresh shells, as a new process would
+        inflight.cancel_all()
+        # Both block on `docker exec`; keep the daemon's event loop free
+        await asyncio.to_thread(job_registry.reap_all)
+        await asyncio.to_thread(shell_sessions.close_all)
+
+async def main():
+    await run_session(create_graph())
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -0,0 +1,164 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+
+from config import CHECKPOINT_DIR, MESSAGE_STORE, MESSAGE_STORE_MIN_CHARS, MESSAGE_STORE_CACHE_MB
+from logger import logger
+
+# Content of an interned message: "<<ralph-ref <sha1 of the body> <body length>>>"
+REF_PATTERN = re.compile(r"^<<ralph-ref ([0-9a-f]{40}) (\d+)>>$")
+
+# The bulky message types. AIMessages carry the tool calls, system messages are the cached prompt prefix.
+INTERNED_TYPES = (ToolMessage, HumanMessage)
+
+class MessageStore:
+    """
+    Content-addressed store for large message bodies.
+    `intern` swaps a message's content for a short reference and writes the body once (zlib, one file per
+    digest, so identical tool outputs are stored once). `materialize` restores the bodies right before a
+    provider request. Blobs live next to the checkpoint journal, so references survive a resume;
+    only a bounded LRU of decompressed bodies stays in memory.
+    """
+
+    def __init__(self, directory: str, min_chars: int, cache_bytes: int, enabled: bool = True):
+        self.directory = directory
+        self.min_chars = min_chars
+        self.cache_bytes = cache_bytes
+        self.enabled = enabled
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_size = 0
+        self._known = set()
+        self._lock = threading.Lock()
+        self.interned = 0
+        self.deduplicated = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest + ".z")
+
+    def _remember(self, digest: str, text: str):
+        """Caller holds the lock."""
+        if digest in self._cache or len(text) > self.cache_bytes:
+            return
+        self._cache[digest] = text
+        self._cache_size += len(text)
+        while self._cache_size > self.cache_bytes and self._cache:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_size -= len(evicted)
+
+    def put(self, text: str) -> str:
+        """Stores `text` (once per distinct body) and returns its digest."""
+        data = text.encode("utf-8")
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            if digest in self._known:
+                self.deduplicated += 1
+                return digest
+
+        path = self._path(digest)
+        if not os.path.exists(path):
+            payload = zlib.compress(data, 6)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self.stored_bytes += len(payload)
+
+        with self._lock:
+            self._known.add(digest)
+            self.interned += 1
+            self.raw_bytes += len(data)
+            # The next Manager request materializes it right away
+            self._remember(digest, text)
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        """The body for `digest` (None if the blob is missing or corrupt)."""
+        with self._lock:
+            text = self._cache.get(digest)
+            if text is not None:
+                self._cache.move_to_end(digest)
+                return text
+        try:
+            with open(self._path(digest), "rb") as f:
+                text = zlib.decompress(f.read()).decode("utf-8")
+        except (OSError, zlib.error, UnicodeDecodeError) as e:
+            logger.error(f"Message store: cannot load {digest}: {e}")
+            return None
+        with self._lock:
+            self._known.add(digest)
+            self._remember(digest, text)
+        return text
+
+    def intern(self, msg: BaseMessage) -> BaseMessage:
+        """Returns `msg` with its body replaced by a reference (unchanged if small, structured or disabled)."""
+        content = msg.content
+        if (
+            not self.enabled
+            or not isinstance(msg, INTERNED_TYPES)
+            or not isinstance(content, str)
+            or len(content) < self.min_chars
+            or REF_PATTERN.match(content)
+        ):
+            return msg
+        digest = self.put(content)
+        return msg.model_copy(update={"content": f"<<ralph-ref {digest} {len(content)}>>"})
+
+    def intern_all(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        return [self.intern(m) for m in messages]
+
+    def materialize(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """Copy of `messages` with every reference replaced by its body (other messages are shared, not copied)."""
+        out = []
+        for msg in messages:
+            match = REF_PATTERN.match(msg.content) if isinstance(msg.content, str) else None
+            if match:
+                text = self.get(match.group(1))
+                if text is None:
+                    text = f"[Message body unavailable ({match.group(2)} chars)]"
+                msg = msg.model_copy(update={"content": text})
+            out.append(msg)
+        return out
+
+    def clear(self):
+        """Drops every blob (called when the checkpoint journal is cleared)."""
+        with self._lock:
+            self._cache.clear()
+            self._cache_size = 0
+            self._known.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def reset_stats(self):
+        """Counters only; the blobs and the cache stay."""
+        with self._lock:
+            self.interned = 0
+            self.deduplicated = 0
+            self.raw_bytes = 0
+            self.stored_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "interned": self.interned,
+                "deduplicated": self.deduplicated,
+                "raw_bytes": self.raw_bytes,
+                "stored_bytes": self.stored_bytes,
+                "cached_bytes": self._cache_size,
+            }
+
+message_store = MessageStore(
+    os.path.join(CHECKPOINT_DIR, "messages"),
+    MESSAGE_STORE_MIN_CHARS,
+    int(MESSAGE_STORE_CACHE_MB * 1024 * 1024),
+    MESSAGE_STORE
+)
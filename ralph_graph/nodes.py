@@ -1,99 +1,145 @@
-import sys
+import asyncio
 import json
 import logging
-import tiktoken
-from typing import List, Annotated, Literal, Any, Dict
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage, AIMessage, BaseMessage
+import time
+from functools import lru_cache
+from typing import List, Annotated, Literal, Any, Dict, Optional
+from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage, AIMessage, BaseMessage, RemoveMessage, message_chunk_to_message
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langgraph.prebuilt import create_react_agent
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
 from langgraph.types import Send
 from pydantic import BaseModel, Field
 
-from config import RALPH_MODEL, SUBAGENT_MODEL, OPENROUTER_API_KEY, PROMPTS_DIR, WORKSPACE_DIR
-from tools import read_file, list_dir, write_file, run_command, git_commit, context7_tool
+from config import RALPH_MODEL, SUBAGENT_MODEL, OPENROUTER_API_KEY, OPENROUTER_BASE_URL, PROMPTS_DIR, WORKSPACE_DIR, TOKEN_LIMIT, COMPACTION_TRIGGER, STREAM_DISPATCH
+from tools import read_file, list_dir, write_file, stat_path, run_command, git_commit, context7_tool
+from tools import job_status, job_tail, job_wait_ready, job_kill
 from state import AgentState, WorkerTask
 from logger import logger
+from token_ledger import count_message_tokens
+from compaction import compact_messages, truncate_tool_results
+from message_store import message_store
+from result_budget import result_budget, reads_spilled_results
+from scheduler import get_scheduler, LANE_PRIORITY
+from early_dispatch import inflight, ToolCallTracker
+from task_graph import plan_waves, task_dependencies
+from prompt_cache import cache_telemetry
+from tracing import span, traced_node, current_span_id, tracing_handler
+from usage import agent_scope, usage_handler
+
+# --- MODELS ---
+# Built on first use (memoized): importing this module, e.g. for generate_graph.py, stays cheap.
+
+def _chat_model(model: str, **kwargs):
+    # langchain_openai pulls in the openai SDK; deferred until a model is actually needed
+    from langchain_openai import ChatOpenAI
+    scheduler = get_scheduler(model)
+    return ChatOpenAI(
+        model=model,
+        api_key=OPENROUTER_API_KEY,
+        base_url=OPENROUTER_BASE_URL,
+        # This passes extra fields directly in the request body
+        extra_body={
+            "provider": {
+                "only": ["chutes"],           # strict: only Chutes, fail if unavailable
+                # OR use "order": ["chutes"]   # prefer Chutes first, fallback to others
+                # OR "ignore": ["mistral"]     # skip official Mistral provider
+            },
+            # Usage with cached token details and cost (see prompt_cache.py / usage.py)
+            "usage": {"include": True}
+        },
+        max_tokens=8192,
+        # Every request waits for the model's rate limit; the response headers adapt it (see scheduler.py)
+        rate_limiter=scheduler.rate_limiter,
+        include_response_headers=True,
+        # llm spans (see tracing.py), provider-reported token usage (see usage.py) and rate limit headers
+        callbacks=[tracing_handler, usage_handler, scheduler.callback],
+        **kwargs
+    )
 
-# Initialize Models
-llm = ChatOpenAI(
-    model=RALPH_MODEL,
-    api_key=OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1",
-    # This passes extra fields directly in the request body
-    extra_body={
-        "provider": {
-            "only": ["chutes"],           # strict: only Chutes, fail if unavailable
-            # OR use "order": ["chutes"]   # prefer Chutes first, fallback to others
-            # OR "ignore": ["mistral"]     # skip official Mistral provider
-        }
-    },
-    max_tokens=8192
-)
-
-subagent_llm = ChatOpenAI(
-    model=SUBAGENT_MODEL,
-    api_key=OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1",
-    # This passes extra fields directly in the request body
-    extra_body={
-        "provider": {
-            "only": ["chutes"],           # strict: only Chutes, fail if unavailable
-            # OR use "order": ["chutes"]   # prefer Chutes first, fallback to others
-            # OR "ignore": ["mistral"]     # skip official Mistral provider
-        }
-    },
-    max_tokens=8192
-)
+@lru_cache(maxsize=None)
+def get_llm():
+    """The Manager model."""
+    # Token usage on the final chunk when the Manager response is streamed
+    return _chat_model(RALPH_MODEL, stream_usage=True)
 
-TOKEN_LIMIT = 20000
-REMAINING_GRACE_TURNS = 5
+@lru_cache(maxsize=None)
+def get_subagent_llm():
+    """The model shared by all sub-agents."""
+    return _chat_model(SUBAGENT_MODEL)
 
 # --- WORKER SUB-AGENTS ---
 
+# Result of each finished dependency that is passed on to a dependent worker
+PREREQUISITE_RESULT_CHARS = 500
+
+def _react_agent(tools):
+    # langgraph.prebuilt is only needed once an agent is built
+    from langgraph.prebuilt import create_react_agent
+    return create_react_agent(get_subagent_llm(), tools)
+
+@lru_cache(maxsize=None)
 def create_worker_agent():
     """Creates a ReAct agent for the worker."""
     tools = [read_file, write_file, list_dir]
-    return create_react_agent(subagent_llm, tools)
-
-worker_agent = create_worker_agent()
+    return _react_agent(tools)
 
+@lru_cache(maxsize=None)
 def create_command_agent():
     """Creates a ReAct agent for running commands."""
-    tools = [run_command]
-    return create_react_agent(subagent_llm, tools)
-
-command_agent = create_command_agent()
+    tools = [run_command, job_status, job_tail, job_wait_ready, job_kill]
+    return _react_agent(tools)
 
+@lru_cache(maxsize=None)
 def create_admin_agent():
     """Creates a ReAct agent for admin tasks."""
-    tools = [read_file, write_file, list_dir]
-    return create_react_agent(subagent_llm, tools)
-
-admin_agent = create_admin_agent()
+    tools = [read_file, write_file, list_dir, stat_path]
+    return _react_agent(tools)
 
+@lru_cache(maxsize=None)
 def create_research_agent():
     """Creates a ReAct agent for research using Context7."""
     tools = [context7_tool]
-    return create_react_agent(subagent_llm, tools)
-
-research_agent = create_research_agent()
+    return _react_agent(tools)
 
 # --- MANAGER TOOLS ---
 
 class PlanTasks(BaseModel):
-    """Delegate heavy lifting coding tasks to subordinate workers."""
+    """
+    Delegate heavy lifting coding tasks to subordinate workers.
+    Tasks run in parallel. Give a task `depends_on` (task_ids, or 0-based positions, of tasks in this call)
+    to start it only after those tasks succeeded; it also gets their results.
+    """
     tasks: List[WorkerTask] = Field(description="List of tasks to delegate")
 
 class DelegateCommand(BaseModel):
-    """Delegate a shell command execution to the Command Agent."""
+    """
+    Delegate a shell command execution to the Command Agent.
+    You may call this several times in one turn (e.g. lint, test and typecheck); the commands run in parallel.
+    """
     command: str = Field(description="The shell command to execute.")
-    background: bool = Field(default=False, description="Run in background.")
+    background: bool = Field(default=False, description="Run in background as a job (e.g. dev servers). Returns a job ID for job_status / job_tail / job_wait_ready / job_kill.")
+    ready_port: int = Field(default=0, description="Background only. Wait until this port accepts connections before returning.")
+    ready_pattern: str = Field(default="", description="Background only. Wait until the job log matches this regex before returning.")
+    sequence_group: Optional[str] = Field(default=None, description="Optional. Commands with the same group run one after another, in the order you called them (e.g. 'build' then 'test'). Commands without a group run in parallel.")
+    timeout: int = Field(default=120, description="Maximum time in seconds to wait for the command.")
+    interpret: bool = Field(default=False, description="By default the command runs directly and you get the raw output. Set True to have the Command Agent run it and interpret the output or recover from failures (slower).")
+
+class AdminOperation(BaseModel):
+    """A single file operation executed directly (no agent)."""
+    op: Literal["read", "list", "write", "stat"] = Field(description="Operation to perform.")
+    path: str = Field(description="Path relative to the workspace.")
+    content: Optional[str] = Field(default=None, description="Content for 'write'.")
+    mode: Literal["overwrite", "append"] = Field(default="overwrite", description="Write mode for 'write'.")
 
 class DelegateAdmin(BaseModel):
-    """Delegate file/system admin tasks to the Admin Agent."""
-    task_description: str = Field(description="Description of the admin task (e.g. 'read file X', 'list dir Y').")
+    """
+    Delegate file/system admin tasks to the Admin Agent.
+    Prefer `operations` for simple reads/listings/writes: they run instantly without an agent.
+    """
+    task_description: Optional[str] = Field(default=None, description="Free-form description of the admin task for the Admin Agent (e.g. 'find all TODOs in src/'). Ignored when `operations` is given.")
+    operations: Optional[List[AdminOperation]] = Field(default=None, description="Batch of structured operations (read/list/write/stat) executed directly, in order.")
 
 class DelegateResearch(BaseModel):
     """
@@ -104,99 +150,178 @@ class DelegateResearch(BaseModel):
     query: str = Field(description="The specific question or feature to look up (e.g. 'connection string format', 'how to use actions').")
     library_name: str = Field(description="The name of the library (e.g. 'prisma', 'react', 'next.js').")
 
-# Manager retains git_commit directly
-manager_tools = [git_commit, PlanTasks, DelegateCommand, DelegateAdmin, DelegateResearch]
-manager_llm_with_tools = llm.bind_tools(manager_tools)
+# Manager retains git_commit and the background job controls directly
+LOCAL_TOOLS = {t.name: t for t in [git_commit, job_status, job_tail, job_wait_ready, job_kill]}
+manager_tools = [git_commit, job_status, job_tail, job_wait_ready, job_kill, PlanTasks, DelegateCommand, DelegateAdmin, DelegateResearch]
 
-# --- NODES ---
+@lru_cache(maxsize=None)
+def get_manager_llm_with_tools():
+    return get_llm().bind_tools(manager_tools)
 
-def manager_node(state: AgentState):
+# --- NODES ---
+# LLM-bound nodes are async: the graph is driven with `app.ainvoke`, so every Send
+# branch from `dispatch_logic` runs as a task on one event loop instead of a thread.
+
+@traced_node("compactor")
+def compactor_node(state: AgentState):
+    """Compacts the history into a digest before the Manager runs when the token budget is near."""
+    token_count = state.get("token_count", 0)
+    if token_count < TOKEN_LIMIT * COMPACTION_TRIGGER:
+        return {}
+
+    # Digest lines and tool result truncation need the bodies of interned messages
+    messages = message_store.materialize(state["messages"])
+    logger.warning(f"⚠️ Context at {token_count}/{TOKEN_LIMIT} tokens. Compacting history...")
+
+    compacted, evicted = compact_messages(messages)
+    new_count = count_message_tokens(compacted)
+
+    # Still over budget (e.g. one huge recent turn): trim the verbatim tool results as well
+    cut = 0
+    if new_count >= TOKEN_LIMIT * COMPACTION_TRIGGER:
+        compacted, cut = truncate_tool_results(compacted)
+        if cut:
+            new_count = count_message_tokens(compacted)
+            logger.info(f"Truncated {cut} oversized tool results.")
+
+    if not evicted and not cut:
+        logger.warning("Nothing left to compact.")
+        return {}
+
+    logger.info(f"Compaction: evicted {evicted} messages. Context {token_count} -> {new_count} tokens.")
+    # Replace the whole history (ids are preserved so add_messages keeps ordering stable)
+    return {
+        "messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)] + message_store.intern_all(compacted),
+        "token_count": new_count - token_count
+    }
+
+async def run_subagent(lane: str, agent, inputs: dict, agent_id: Optional[str] = None) -> dict:
+    """
+    Runs a sub-agent inside a SUBAGENT_MODEL scheduler slot (bounded concurrency, priority lane).
+    Each of its LLM requests is rate limited separately by the chat model.
+    """
+    scheduler = get_scheduler(SUBAGENT_MODEL)
+    with span(f"subagent:{lane}", "agent") as s, agent_scope(lane, agent_id):
+        queued = time.monotonic()
+        async with scheduler.slot(lane):
+            if s:
+                s.set(queue_seconds=round(time.monotonic() - queued, 4))
+            return await agent.ainvoke(inputs)
+
+async def stream_manager_response(messages: list):
+    """
+    Streams the Manager response and starts delegated work as each tool call completes.
+    Returns (response, seconds to first chunk).
+    """
+    # Anything left over from a failed run is stale
+    inflight.cancel_all()
+    tracker = ToolCallTracker()
+    response, first_chunk_at, started = None, None, time.monotonic()
+    async for chunk in get_manager_llm_with_tools().astream(messages):
+        if first_chunk_at is None:
+            first_chunk_at = time.monotonic() - started
+        response = chunk if response is None else response + chunk
+        for tc in tracker.completed(response):
+            start_early(tc)
+    if response is None:
+        return AIMessage(content=""), first_chunk_at
+    for tc in tracker.completed(response, final=True):
+        start_early(tc)
+    return message_chunk_to_message(response), first_chunk_at
+
+CONTINUE_PROMPT = "Continue."
+
+@traced_node("manager")
+async def manager_node(state: AgentState):
     """The Manager reasoning node."""
-    global REMAINING_GRACE_TURNS 
-    messages = state["messages"]
+    # The state holds references for large bodies (see message_store.py); the provider needs the full text
+    messages = message_store.materialize(state["messages"])
     logger.info("Manager is thinking...")
-    
-    # Token Limit Safeguard
-    try:
-        enc = tiktoken.encoding_for_model("gpt-4")
-        all_text = "".join([msg.content for msg in messages])
-        token_count = len(enc.encode(all_text))
-        
-        if token_count > TOKEN_LIMIT:
-            if REMAINING_GRACE_TURNS > 0:
-                logger.warning(f"⚠️ Token Limit Reached ({token_count} > {TOKEN_LIMIT}). Grace turns remaining: {REMAINING_GRACE_TURNS}")
-                instruction = (
-                    f"SYSTEM ALERT: Context token limit ({TOKEN_LIMIT}) reached. "
-                    f"You have {REMAINING_GRACE_TURNS} turns left before the process is forcibly terminated. "
-                    "You MUST save your work NOW.\n"
-                    "1. Update `@IMPLEMENTATION_PLAN.md` (mark tasks as partial/done).\n"
-                    "2. Update `@AGENTS.md` with any key learnings.\n"
-                    "3. Call `git_commit` immediately.\n"
-                    "If you fail to do so, the system will force an auto-commit and exit, but your documentation updates may be lost. "
-                    "Do not run any other tools (e.g. do not try to read files or run commands) because the process will exit before you can see their results."
-                )
-                
-                # Fix for Strict Providers (Tool -> AI -> User sequence)
-                injected_safeguard_msgs = []
-                if messages:
-                    last_msg = messages[-1]
-                    if getattr(last_msg, "type", "") == "tool":
-                         logger.info("Injecting dummy AI acknowledgment after ToolMessage to allow warning injection.")
-                         injected_safeguard_msgs.append(AIMessage(content="Tool execution completed. Processing results."))
-
-                # Changed to HumanMessage to avoid "Unexpected role 'system' after role 'tool'" errors
-                # But now we ensure it's preceded by an AI message if needed
-                injected_safeguard_msgs.append(HumanMessage(content=instruction))
-                
-                messages = list(messages) + injected_safeguard_msgs
-                REMAINING_GRACE_TURNS -= 1
-            else:
-                logger.error(f"❌ Hard Token Limit Exceeded ({token_count}) and Grace Period Expired. Force Exit.")
-                
-                # Auto-Save Safety Net
-                try:
-                    logger.info("Performing Auto-Save before exit...")
-                    git_commit.invoke({"message": "Auto-save: Hard token limit exceeded."})
-                except Exception as save_err:
-                    logger.error(f"Auto-save failed: {save_err}")
-                
-                sys.exit(0)
-        else:
-             # Reset grace turns if tokens drop below limit
-             REMAINING_GRACE_TURNS = 5
-
-    except Exception as e:
-        logger.error(f"Token count failed: {e}")
+    # Worker tasks of the previous turn are done
+    task_dependencies.reset()
 
     # Fix for Chutes/Strict Providers: Ensure history doesn't end with AIMessage
+    # The message is only ever appended at the tail and kept in the history,
+    # so the prefix sent on the next call stays identical (provider prompt caching)
     injected_msgs = []
     if messages and isinstance(messages[-1], AIMessage) and not messages[-1].tool_calls:
         logger.info("Injecting 'Continue' message to satisfy provider turn-taking.")
-        cont_msg = HumanMessage(content="Continue.")
+        cont_msg = HumanMessage(content=CONTINUE_PROMPT)
         messages = list(messages) + [cont_msg]
         injected_msgs.append(cont_msg)
 
-    response = manager_llm_with_tools.invoke(messages)
+    started, first_chunk_at = time.monotonic(), None
+    if STREAM_DISPATCH:
+        response, first_chunk_at = await stream_manager_response(messages)
+    else:
+        response = await get_manager_llm_with_tools().ainvoke(messages)
+    cache_telemetry.record(response, time.monotonic() - started, first_chunk_at)
     logger.info(f"Manager response: {response}")
-    return {"messages": injected_msgs + [response]}
-
-def worker_node(state: WorkerTask):
-    """Executes a task assigned to a worker."""
-    task_id = state["task_id"]
-    description = state["description"]
+    new_msgs = injected_msgs + [response]
+
+    # One iteration per Manager turn
+    iteration = state.get("iteration", 0) + 1
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.get("input_tokens"):
+        # Re-anchor the running estimate on the provider's count (includes tool schemas and formatting overhead)
+        actual = usage["input_tokens"] + usage.get("output_tokens", 0)
+        return {"messages": new_msgs, "token_count": actual - state.get("token_count", 0), "iteration": iteration}
+    return {"messages": new_msgs, "token_count": count_message_tokens(new_msgs), "iteration": iteration}
+
+async def run_worker_task(task: WorkerTask) -> str:
+    task_id = task["task_id"]
+    description = task["description"]
     system_prompt = f"You are a Worker. GOAL: {description}. Use tools to read/write files."
-    
+
+    # Dependencies are awaited before taking a scheduler slot, so waiting tasks never hold one
+    failed, prerequisites = await task_dependencies.wait(task)
+    if failed:
+        result = f"Worker {task_id} Skipped: dependency {failed} did not succeed."
+        task_dependencies.finish(task_id, False, result)
+        return result
+    if prerequisites:
+        system_prompt += "\nCompleted prerequisite tasks:\n" + "\n".join(
+            f"- {dep}: {output[:PREREQUISITE_RESULT_CHARS]}" for dep, output in prerequisites
+        )
+
     inputs = {"messages": [SystemMessage(content=system_prompt), HumanMessage(content="Start.")]}
+    ok, output = False, f"Worker {task_id} Cancelled."
     try:
-        result = worker_agent.invoke(inputs)
+        result = await run_subagent("worker", create_worker_agent(), inputs, task_id)
         last_msg = result["messages"][-1].content
-        return {"results": {task_id: f"Worker {task_id} Result: {last_msg}"}}
+        ok, output = True, f"Worker {task_id} Result: {last_msg}"
     except Exception as e:
-        return {"results": {task_id: f"Worker {task_id} Failed: {e}"}}
+        output = f"Worker {task_id} Failed: {e}"
+    finally:
+        # Releases the tasks that depend on this one
+        task_dependencies.finish(task_id, ok, output)
+    return output
+
+@traced_node("worker")
+async def worker_node(state: WorkerTask):
+    """Executes a task assigned to a worker (or collects it if it was started during the Manager stream)."""
+    task_id = state["task_id"]
+    result = await inflight.claim_or_run(task_id, lambda: run_worker_task(state))
+    return {"results": {task_id: result}}
+
+async def run_command_task(task: dict) -> str:
+    """Executes a single DelegateCommand. Runs `run_command` directly unless the Manager asked for interpretation."""
+    cmd = task["command"]
+    if not task.get("interpret"):
+        # Fast path: no LLM round trips, raw output goes straight back to the Manager
+        args = {
+            "command": cmd,
+            "timeout": task.get("timeout", 120),
+            "background": task.get("background", False),
+            "session": task.get("session", "default"),
+            "ready_port": task.get("ready_port", 0),
+            "ready_pattern": task.get("ready_pattern", "")
+        }
+        try:
+            return await asyncio.to_thread(run_command.invoke, args)
+        except Exception as e:
+            return f"Command Failed: {e}\nSUGGESTION: Use `DelegateResearch` to investigate this error."
 
-def command_node(state: dict):
-    """Executes a command via CommandAgent."""
-    cmd = state["command"]
     sys_prompt = (
         "You are a Command Agent. Execute the requested command using `run_command`. "
         "If the command execution appears to hang or takes an excessive amount of time, "
@@ -204,28 +329,39 @@ def command_node(state: dict):
     )
     inputs = {"messages": [SystemMessage(content=sys_prompt), HumanMessage(content=f"Run: {cmd}")]}
     try:
-        result = command_agent.invoke(inputs)
-        output = result["messages"][-1].content
-        return {"results": {state["tool_call_id"]: output}}
+        result = await run_subagent("command", create_command_agent(), inputs, task.get("tool_call_id"))
+        return result["messages"][-1].content
     except Exception as e:
-        return {"results": {state["tool_call_id"]: f"Command Failed: {e}\nSUGGESTION: Use `DelegateResearch` to investigate this error."}}
-
-def admin_node(state: dict):
-    """Executes admin tasks via AdminAgent."""
-    desc = state["task_description"]
+        return f"Command Failed: {e}\nSUGGESTION: Use `DelegateResearch` to investigate this error."
+
+@traced_node("command")
+async def command_node(state: dict):
+    """Executes a batch of commands in order. Batches run in parallel, each command in its own exec session."""
+    results = {}
+    for task in state["commands"]:
+        tid = task["tool_call_id"]
+        results[tid] = await inflight.claim_or_run(tid, lambda: run_command_task(task))
+    return {"results": results}
+
+async def run_admin_task(task: dict) -> str:
+    desc = task["task_description"]
     sys_prompt = "You are an Admin Agent. Perform file/dir operations. NO commands."
     inputs = {"messages": [SystemMessage(content=sys_prompt), HumanMessage(content=desc)]}
     try:
-        result = admin_agent.invoke(inputs)
-        output = result["messages"][-1].content
-        return {"results": {state["tool_call_id"]: output}}
+        result = await run_subagent("admin", create_admin_agent(), inputs, task.get("tool_call_id"))
+        return result["messages"][-1].content
     except Exception as e:
-        return {"results": {state["tool_call_id"]: f"Admin Failed: {e}"}}
+        return f"Admin Failed: {e}"
 
-def research_node(state: dict):
-    """Executes research tasks via ResearchAgent."""
-    query = state["query"]
-    lib = state["library_name"]
+@traced_node("admin")
+async def admin_node(state: dict):
+    """Executes admin tasks via AdminAgent."""
+    tid = state["tool_call_id"]
+    return {"results": {tid: await inflight.claim_or_run(tid, lambda: run_admin_task(state))}}
+
+async def run_research_task(task: dict) -> str:
+    query = task["query"]
+    lib = task["library_name"]
     sys_prompt = (
         "You are an expert Research Agent. Your goal is to find precise technical documentation using Context7. "
         "When calling context7_tool, optimize the 'query' argument to be specific and technical "
@@ -235,71 +371,214 @@ def research_node(state: dict):
     )
     inputs = {"messages": [SystemMessage(content=sys_prompt), HumanMessage(content=f"Find info on '{query}' for library '{lib}'")]}
     try:
-        result = research_agent.invoke(inputs)
-        output = result["messages"][-1].content
-        return {"results": {state["tool_call_id"]: output}}
+        result = await run_subagent("research", create_research_agent(), inputs, task.get("tool_call_id"))
+        return result["messages"][-1].content
     except Exception as e:
-        return {"results": {state["tool_call_id"]: f"Research Failed: {e}"}}
+        return f"Research Failed: {e}"
+
+@traced_node("research")
+async def research_node(state: dict):
+    """Executes research tasks via ResearchAgent."""
+    tid = state["tool_call_id"]
+    return {"results": {tid: await inflight.claim_or_run(tid, lambda: run_research_task(state))}}
 
 # --- DISPATCHER & LOGIC ---
 
 def handle_plan_tasks(tc, args: dict, tasks: list):
-    """Helper to parse PlanTasks."""
+    """
+    Helper to parse PlanTasks. `depends_on` entries (the Manager's task_ids or 0-based positions)
+    are mapped to the internal task ids; a declared task_id wins over a position with the same value.
+    Raises ValueError for duplicate task_ids, unknown dependencies or cycles.
+    """
     raw_list = args.get("tasks", args.get("task_list", [args.get("task")]))
     if not isinstance(raw_list, list): raw_list = [raw_list]
-    
+
+    planned, declared = [], {}
     for i, item in enumerate(raw_list):
         t_id = f"{tc['id']}_{i}"
+        if isinstance(item, dict) and item.get("task_id"):
+            name = str(item["task_id"])
+            if name in declared:
+                raise ValueError(f"task_id {name} is used by more than one task")
+            declared[name] = t_id
         desc = item if isinstance(item, str) else item.get("description", "Unknown")
-        tasks.append({"task_id": t_id, "description": desc, "status": "pending"})
+        planned.append({"task_id": t_id, "description": desc, "status": "pending"})
+    # Numeric task_ids ("1", "2", ...) are common, so positions only resolve refs that are not a declared id
+    ids = {str(i): task["task_id"] for i, task in enumerate(planned)}
+    ids.update(declared)
+
+    for item, task in zip(raw_list, planned):
+        refs = item.get("depends_on") if isinstance(item, dict) else None
+        # 0 (the first task) is a valid dependency
+        if refs is None or refs == []:
+            continue
+        if not isinstance(refs, list): refs = [refs]
+        unknown = [str(r) for r in refs if str(r) not in ids]
+        if unknown:
+            raise ValueError(f"task {task['task_id']} depends on unknown tasks {', '.join(unknown)}")
+        task["depends_on"] = list(dict.fromkeys(ids[str(r)] for r in refs))
+
+    waves = plan_waves(planned)
+    if len(waves) > 1:
+        logger.info(f"PlanTasks {tc['id']}: {len(planned)} tasks in {len(waves)} dependency waves.")
+    tasks.extend(planned)
+
+def command_task(args: dict, tid: str) -> dict:
+    return {
+        "command": args.get("command"),
+        "background": args.get("background", False),
+        "ready_port": args.get("ready_port", 0),
+        "ready_pattern": args.get("ready_pattern", ""),
+        "timeout": args.get("timeout", 120),
+        "interpret": args.get("interpret", False),
+        # Each sequence group keeps its own shell (cwd/env persist inside the group)
+        "session": args.get("sequence_group") or "default",
+        "tool_call_id": tid
+    }
+
+def research_task(args: dict, tid: str) -> dict:
+    return {"query": args.get("query"), "library_name": args.get("library_name"), "tool_call_id": tid}
+
+def start_early(tc: dict):
+    """
+    Starts the branch work for one completed tool call while the Manager is still generating.
+    The matching branch node claims it by the same key. Local tools (git_commit, jobs, admin operations)
+    and sequence groups (order depends on the rest of the response) are left to the dispatcher.
+    """
+    name, args, tid = tc["name"], tc["args"], tc["id"]
+    if name == "PlanTasks":
+        tasks = []
+        try:
+            handle_plan_tasks(tc, args, tasks)
+        except ValueError:
+            return  # reported by the dispatcher; nothing may start
+        # Tasks with dependencies are started by their branch nodes
+        for task in tasks:
+            if not task.get("depends_on"):
+                inflight.start(task["task_id"], run_worker_task(task))
+    elif name == "DelegateCommand" and not args.get("sequence_group"):
+        inflight.start(tid, run_command_task(command_task(args, tid)))
+    elif name == "DelegateAdmin" and not args.get("operations"):
+        inflight.start(tid, run_admin_task({"task_description": args.get("task_description"), "tool_call_id": tid}))
+    elif name == "DelegateResearch":
+        inflight.start(tid, run_research_task(research_task(args, tid)))
+    else:
+        return
+    logger.info(f"Early dispatch: {name} ({tid})")
+
+def execute_admin_operations(operations: list) -> str:
+    """
+    Runs structured DelegateAdmin operations in-process (no LLM).
+    Malformed operations are reported per operation instead of failing the dispatcher.
+    """
+    if not isinstance(operations, list): operations = [operations]
+    outputs = []
+    for op in operations:
+        if not isinstance(op, dict):
+            outputs.append(f"[invalid operation]\nAdmin Failed: expected an object like "
+                           f"{{\"op\": \"read\", \"path\": \"...\"}}, got {str(op)[:200]!r}")
+            continue
+        kind, path = op.get("op"), op.get("path", "")
+        try:
+            if not isinstance(path, str):
+                raise ValueError(f"'path' must be a string, got {path!r}")
+            if kind == "read":
+                output = read_file.invoke({"path": path})
+            elif kind == "list":
+                output = list_dir.invoke({"path": path})
+            elif kind == "write":
+                content = op.get("content") or ""
+                if not isinstance(content, str):
+                    raise ValueError(f"'content' must be a string, got {type(content).__name__}")
+                output = write_file.invoke({"path": path, "content": content, "mode": op.get("mode") or "overwrite"})
+            elif kind == "stat":
+                output = stat_path.invoke({"path": path})
+            else:
+                output = f"Error: Unknown operation '{kind}'. Use read, list, write or stat."
+        except Exception as e:
+            output = f"Admin Failed: {e}"
+        outputs.append(f"[{kind} {path}]\n{output}")
+    return "\n\n".join(outputs)
 
+@traced_node("dispatcher")
 def dispatcher_node(state: AgentState):
     """Routes Manager tool calls."""
     last_message = state["messages"][-1]
     if not last_message.tool_calls: return {}
     
-    tasks, admin_tasks, cmd_task, research_tasks = [], [], None, []
+    tasks, admin_tasks, research_tasks = [], [], []
+    # sequence_group -> commands run in order. Ungrouped commands get their own batch.
+    cmd_batches = {}
     local_results = {}
     
     for tc in last_message.tool_calls:
         name, args, tid = tc["name"], tc["args"], tc["id"]
         
         if name == "PlanTasks":
-            handle_plan_tasks(tc, args, tasks)
+            try:
+                handle_plan_tasks(tc, args, tasks)
+            except ValueError as e:
+                # Rejected before any of its tasks started
+                local_results[tid] = f"Plan Error: {e}. No task of this call was started."
         elif name == "DelegateCommand":
-            # Singleton constraint: Only take the first command task
-            if cmd_task is None:
-                cmd_task = {"command": args.get("command"), "tool_call_id": tid}
-            else:
-                local_results[tid] = "Error: Only one Command Agent allowed per turn."
+            group = args.get("sequence_group") or tid
+            cmd_batches.setdefault(group, []).append(command_task(args, tid))
         elif name == "DelegateAdmin":
-            admin_tasks.append({"task_description": args.get("task_description"), "tool_call_id": tid})
+            if args.get("operations"):
+                # Deterministic fast path
+                local_results[tid] = execute_admin_operations(args["operations"])
+            else:
+                admin_tasks.append({"task_description": args.get("task_description"), "tool_call_id": tid})
         elif name == "DelegateResearch":
-            research_tasks.append({"query": args.get("query"), "library_name": args.get("library_name"), "tool_call_id": tid})
+            research_tasks.append(research_task(args, tid))
         elif name == "git_commit":
              # Execute locally
              try:
                  local_results[tid] = git_commit.invoke(args)
              except Exception as e:
                  local_results[tid] = f"Git Error: {e}"
+        elif name in LOCAL_TOOLS:
+            try:
+                local_results[tid] = LOCAL_TOOLS[name].invoke(args)
+            except Exception as e:
+                local_results[tid] = f"Job Error: {e}"
         else:
              local_results[tid] = f"Error: Unknown tool {name}"
 
+    # Branch spans link back to this dispatcher span across the Send fan-out
+    parent_span_id = current_span_id()
+    for task in tasks + admin_tasks + research_tasks:
+        task["parent_span_id"] = parent_span_id
+
     # Flatten updates
     updates = {"results": local_results}
     if tasks: updates["pending_tasks"] = tasks
     if admin_tasks: updates["admin_queue"] = admin_tasks
     if research_tasks: updates["research_queue"] = research_tasks
-    if cmd_task: updates["command_queue"] = cmd_task # Single item
+    if cmd_batches: updates["command_queue"] = [{"commands": batch, "parent_span_id": parent_span_id} for batch in cmd_batches.values()]
     
     return updates
 
-def should_continue(state: AgentState):
+def should_continue(state: AgentState, config: RunnableConfig):
     """Decides next edge."""
     msg = state["messages"][-1]
-    if not isinstance(msg, AIMessage) or not msg.tool_calls: return END
+    if not isinstance(msg, AIMessage) or not msg.tool_calls: return next_iteration(state, config)
     return "dispatch"
 
+def next_iteration(state: AgentState, config: RunnableConfig):
+    """
+    Ends the run once the Manager called git_commit or the session's iteration limit
+    (`iteration_limit` in the run config, see main.py) is reached, otherwise loops back for the next Manager turn.
+    """
+    # The Manager turn is the last AIMessage (followed only by this turn's tool results)
+    last_ai = next((m for m in reversed(state["messages"]) if isinstance(m, AIMessage)), None)
+    if last_ai and any(tc["name"] == "git_commit" for tc in last_ai.tool_calls):
+        return END
+    limit = (config.get("configurable") or {}).get("iteration_limit")
+    if limit and state.get("iteration", 0) >= limit:
+        return END
+    return "next"
+
 def dispatch_logic(state: AgentState):
     """Routes execution."""
     dests = []
@@ -308,30 +587,54 @@ def dispatch_logic(state: AgentState):
     if state.get("admin_queue"):
         dests.extend([Send("admin", t) for t in state["admin_queue"]])
     if state.get("command_queue"):
-        dests.append(Send("command", state["command_queue"]))
+        dests.extend([Send("command", batch) for batch in state["command_queue"]])
     if state.get("research_queue"):
         dests.extend([Send("research", t) for t in state["research_queue"]])
-        
+
+    # Start higher priority lanes first. Concurrency is bounded by the scheduler in each branch.
+    dests.sort(key=lambda send: LANE_PRIORITY.get(send.node, len(LANE_PRIORITY)))
     return dests if dests else "reducer"
 
+@traced_node("reducer")
 def reduce_node(state: AgentState):
     """Aggregates results."""
     results = state.get("results", {})
     last_msg = state["messages"][-1]
-    new_msgs = []
-    
+
+    # One budget entry per result: a tool call, or a single worker task of a PlanTasks call
+    entries, owners = [], []
     for tc in last_msg.tool_calls:
         tid = tc["id"]
         name = tc["name"]
-        content = str(results.get(tid, f"No result for {name}"))
-        
-        if name == "PlanTasks":
-            # Aggregate worker results
-            p_tasks = state.get("pending_tasks", [])
-            outputs = [str(results.get(t["task_id"], f"Task {t['task_id']} Pending")) for t in p_tasks]
-            content = "\n\n".join(outputs)
-            
-        new_msgs.append(ToolMessage(content=content, tool_call_id=tid))
-        
-    # Clean up queues
-    return {"messages": new_msgs, "pending_tasks": [], "admin_queue": [], "command_queue": None, "research_queue": []}
+
+        if name == "PlanTasks" and tid in results:
+            # Rejected plan (see dispatcher_node)
+            entries.append({"label": name, "content": str(results[tid])})
+            owners.append(tid)
+        elif name == "PlanTasks":
+            # Aggregate the results of this call's workers (task ids are "<tool call id>_<n>")
+            for t in state.get("pending_tasks", []):
+                if not t["task_id"].startswith(f"{tid}_"):
+                    continue
+                entries.append({"label": f"Worker {t['task_id']}", "content": str(results.get(t["task_id"], f"Task {t['task_id']} Pending"))})
+                owners.append(tid)
+        else:
+            entries.append({
+                "label": name,
+                "content": str(results.get(tid, f"No result for {name}")),
+                "exempt": name == "DelegateAdmin" and reads_spilled_results(tc["args"]),
+            })
+            owners.append(tid)
+
+    # Oversized results are spilled to the workspace and replaced by a digest (see result_budget.py)
+    contents = result_budget.apply(entries)
+    new_msgs = []
+    for tc in last_msg.tool_calls:
+        parts = [c for owner, c in zip(owners, contents) if owner == tc["id"]]
+        new_msgs.append(ToolMessage(content="\n\n".join(parts), tool_call_id=tc["id"]))
+
+    # Counted on the full bodies, stored as references
+    token_count = count_message_tokens(new_msgs)
+    new_msgs = message_store.intern_all(new_msgs)
+    # Clean up queues and this iteration's results (None resets merge_dicts)
+    return {"messages": new_msgs, "token_count": token_count, "results": None, "pending_tasks": [], "admin_queue": [], "command_queue": [], "research_queue": []}
@@ -0,0 +1,138 @@
+import os
+import re
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+from config import (
+    WORKSPACE_DIR,
+    OUTPUT_INLINE_LIMIT,
+    OUTPUT_HEAD_BYTES,
+    OUTPUT_TAIL_LINES,
+    OUTPUT_MAX_ERROR_LINES,
+    OUTPUT_LOGS_KEEP,
+)
+from ralph_dir import RALPH_DIR, ralph_path, prune_files
+
+# Relative to WORKSPACE_DIR so agents can read the spilled logs with read_file
+COMMAND_LOGS_DIR = os.path.join(RALPH_DIR, "logs")
+
+ERROR_PATTERN = re.compile(rb"error|fail|exception|traceback|fatal|panic|denied|not found", re.IGNORECASE)
+# Longest line kept for the tail / error excerpts
+MAX_LINE_BYTES = 1000
+
+def new_log_prefix() -> str:
+    """Unique, sortable file prefix for one command's logs."""
+    return f"cmd-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+class OutputCapture:
+    """
+    Memory-bounded capture of one output stream.
+    Output up to OUTPUT_INLINE_LIMIT bytes is kept whole. Past that, everything is streamed to a
+    workspace log file and only the head, the last lines and lines matching ERROR_PATTERN stay in memory.
+    """
+
+    def __init__(self, name: str, log_prefix: str):
+        self.name = name
+        self.rel_path = os.path.join(COMMAND_LOGS_DIR, f"{log_prefix}.{name}.log")
+        self.buffer = bytearray()
+        self.spill = None
+        self.total_bytes = 0
+        self.line_count = 0
+        self.head = b""
+        self.tail = deque(maxlen=OUTPUT_TAIL_LINES)
+        self.errors = deque(maxlen=OUTPUT_MAX_ERROR_LINES)
+        self._partial = bytearray()
+
+    @property
+    def truncated(self) -> bool:
+        return self.spill is not None
+
+    def feed(self, chunk: bytes):
+        if not chunk:
+            return
+        self.total_bytes += len(chunk)
+        self._scan_lines(chunk)
+
+        if self.spill is None:
+            self.buffer += chunk
+            if len(self.buffer) > OUTPUT_INLINE_LIMIT:
+                self._start_spill()
+        else:
+            self.spill.write(chunk)
+
+    def _start_spill(self):
+        logs_dir = ralph_path("logs")
+        self.spill = open(os.path.join(WORKSPACE_DIR, self.rel_path), "wb")
+        # The newest logs are the ones recent results point at
+        prune_files(logs_dir, OUTPUT_LOGS_KEEP)
+        self.spill.write(self.buffer)
+        self.head = bytes(self.buffer[:OUTPUT_HEAD_BYTES])
+        self.buffer = bytearray()
+
+    def _scan_lines(self, chunk: bytes):
+        """Tracks line numbers, the last lines and error lines without keeping the whole stream."""
+        data = self._partial + chunk
+        lines = data.split(b"\n")
+        partial = lines.pop()
+        for line in lines:
+            self._add_line(line)
+        # Bound a runaway line (e.g. progress bars without newlines)
+        self._partial = bytearray(partial[-MAX_LINE_BYTES:])
+
+    def _add_line(self, line: bytes):
+        self.line_count += 1
+        line = line[:MAX_LINE_BYTES]
+        self.tail.append(line)
+        if ERROR_PATTERN.search(line):
+            self.errors.append((self.line_count, line))
+
+    def close(self):
+        if self._partial:
+            self._add_line(bytes(self._partial))
+            self._partial = bytearray()
+        if self.spill is not None:
+            self.spill.close()
+
+    def render(self) -> str:
+        """Full output when small, otherwise a compact head / errors / tail summary with the log path."""
+        if not self.truncated:
+            return self.buffer.decode("utf-8", "replace")
+
+        head = self.head.decode("utf-8", "replace")
+        head_lines = head.count("\n")
+        omitted = max(0, self.line_count - head_lines - len(self.tail))
+        parts = [
+            f"[{self.total_bytes} bytes, {self.line_count} lines. Truncated, full log: {self.rel_path}]",
+            head,
+            f"... [{omitted} lines omitted] ...",
+            "\n".join(line.decode("utf-8", "replace") for line in self.tail),
+        ]
+        if self.errors:
+            parts.append("[Lines matching error patterns]")
+            parts.extend(f"L{n}: {line.decode('utf-8', 'replace')}" for n, line in self.errors)
+        return "\n".join(parts)
+
+class CommandCapture:
+    """stdout + stderr captures for one command."""
+
+    def __init__(self, log_prefix: Optional[str] = None):
+        prefix = log_prefix or new_log_prefix()
+        self.streams = {
+            "stdout": OutputCapture("stdout", prefix),
+            "stderr": OutputCapture("stderr", prefix),
+        }
+
+    def feed(self, stream: str, chunk: bytes):
+        self.streams[stream].feed(chunk)
+
+    def close(self):
+        for capture in self.streams.values():
+            capture.close()
+
+    def render(self, returncode) -> str:
+        output = f"STDOUT:\n{self.streams['stdout'].render()}\nSTDERR:\n{self.streams['stderr'].render()}"
+        if returncode is not None and returncode != 0:
+            output += f"\nExit Code: {returncode}"
+        return output
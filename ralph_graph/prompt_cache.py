@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from config import PROMPTS_DIR, WORKSPACE_DIR, RALPH_MODEL, PROMPT_CACHE_CONTROL
+from logger import logger, LOGS_DIR
+
+# Order matters: most stable first, so edits to the plan only invalidate the tail of the prefix
+PREFIX_FILES = ["AGENTS.md", "IMPLEMENTATION_PLAN.md"]
+
+# Providers on OpenRouter that need explicit cache_control breakpoints.
+# Others (OpenAI, DeepSeek, ...) cache matching prefixes automatically.
+CACHE_CONTROL_PREFIXES = ("anthropic/", "google/gemini")
+
+def use_cache_control(model: str = RALPH_MODEL) -> bool:
+    if PROMPT_CACHE_CONTROL in ("true", "false"):
+        return PROMPT_CACHE_CONTROL == "true"
+    return model.startswith(CACHE_CONTROL_PREFIXES)
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        return text if text.strip() else None
+    except FileNotFoundError:
+        return None
+
+def build_system_message(prompt_file: str = "build.md") -> SystemMessage:
+    """
+    One SystemMessage holding the whole stable prefix: prompt, then AGENTS.md, then the plan.
+    Built once per run; the Manager reads newer versions of the files with tools, the prefix stays byte-identical.
+    """
+    prompt = _read(os.path.join(PROMPTS_DIR, prompt_file))
+    if prompt is None:
+        raise FileNotFoundError(f"Could not find prompt at {os.path.join(PROMPTS_DIR, prompt_file)}")
+
+    sections = [prompt]
+    for name in PREFIX_FILES:
+        text = _read(os.path.join(WORKSPACE_DIR, name))
+        if text is not None:
+            # Snapshot taken at the start of the run
+            sections.append(f"# @{name} (snapshot at start of run)\n\n{text}")
+
+    if not use_cache_control():
+        return SystemMessage(content="\n\n".join(sections))
+
+    blocks = [{"type": "text", "text": text} for text in sections]
+    # One breakpoint at the end of the prefix covers all sections
+    blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    return SystemMessage(content=blocks)
+
+class CacheTelemetry:
+    """Per-call cached / uncached prompt token counts from response usage, appended to logs/prompt-cache.jsonl."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.totals = {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0}
+
+    def record(self, response: BaseMessage, latency: float, first_token_latency: Optional[float] = None):
+        usage = getattr(response, "usage_metadata", None) or {}
+        details = usage.get("input_token_details") or {}
+        input_tokens = usage.get("input_tokens", 0)
+        cached = details.get("cache_read", 0) or 0
+        entry = {
+            "ts": time.time(),
+            "model": RALPH_MODEL,
+            "input_tokens": input_tokens,
+            "cached_tokens": cached,
+            "uncached_tokens": input_tokens - cached,
+            "cache_write_tokens": details.get("cache_creation", 0) or 0,
+            "output_tokens": usage.get("output_tokens", 0),
+            "latency": round(latency, 3),
+            "first_token_latency": round(first_token_latency, 3) if first_token_latency is not None else None,
+        }
+        with self._lock:
+            self.totals["calls"] += 1
+            for key in ("input_tokens", "cached_tokens", "cache_write_tokens", "output_tokens"):
+                self.totals[key] += entry[key]
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        if not usage:
+            logger.debug("Manager response carried no usage data.")
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            totals = dict(self.totals)
+        totals["hit_ratio"] = round(totals["cached_tokens"] / totals["input_tokens"], 3) if totals["input_tokens"] else 0.0
+        return totals
+
+cache_telemetry = CacheTelemetry(os.path.join(LOGS_DIR, "prompt-cache.jsonl"))
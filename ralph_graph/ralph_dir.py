@@ -0,0 +1,40 @@
+import os
+
+from config import WORKSPACE_DIR
+from logger import logger
+
+# Scratch data kept in the workspace (spilled command logs, background job logs, spilled tool results).
+# Relative to WORKSPACE_DIR so agents can read it with read_file.
+RALPH_DIR = ".ralph"
+
+def ralph_path(*parts: str) -> str:
+    """
+    Absolute path of a directory under <workspace>/.ralph, created on first use together with
+    `.ralph/.gitignore` (`*`), so git_commit (`git add -A`) never picks up the scratch data.
+    """
+    root = os.path.join(WORKSPACE_DIR, RALPH_DIR)
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    ignore = os.path.join(root, ".gitignore")
+    if not os.path.exists(ignore):
+        with open(ignore, "w", encoding="utf-8") as f:
+            f.write("*\n")
+    return path
+
+def prune_files(directory: str, keep: int):
+    """Deletes all but the `keep` most recently modified files in `directory` (0 = keep everything)."""
+    if keep <= 0:
+        return
+    files = []
+    try:
+        for entry in os.scandir(directory):
+            if entry.is_file():
+                files.append((entry.stat().st_mtime, entry.path))
+    except OSError:
+        return
+    files.sort(reverse=True)
+    for _, path in files[keep:]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.debug(f"Could not prune {path}: {e}")
@@ -0,0 +1,155 @@
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Dict, List
+
+from config import WORKSPACE_DIR, RESULT_CALL_TOKENS, RESULT_TURN_TOKENS
+from logger import logger
+from output_capture import ERROR_PATTERN
+from ralph_dir import RALPH_DIR, ralph_path
+from token_ledger import count_text_tokens, CHARS_PER_TOKEN
+
+# Relative to WORKSPACE_DIR so the Manager can read a spilled result on demand (DelegateAdmin read)
+RESULTS_DIR = os.path.join(RALPH_DIR, "results")
+
+TEXT_ERROR_PATTERN = re.compile(ERROR_PATTERN.pattern.decode(), re.IGNORECASE)
+# Longest line kept for the tail / error excerpts of a digest
+DIGEST_LINE_CHARS = 200
+
+class ResultBudget:
+    """
+    Keeps one Manager turn's tool results within a per-result and a per-turn token budget.
+    Results over budget are spilled whole to RESULTS_DIR and replaced by a digest (head, last lines,
+    error lines) that points at the file. Budget hits are counted for the iteration metrics.
+    """
+
+    def __init__(self, call_tokens: int, turn_tokens: int):
+        self.call_tokens = call_tokens
+        self.turn_tokens = turn_tokens
+        self._lock = threading.Lock()
+        self.results = 0
+        self.call_budget_hits = 0
+        self.turn_budget_hits = 0
+        self.spilled_tokens = 0
+
+    def _digest(self, label: str, content: str, tokens: int, rel_path: str, reason: str) -> str:
+        # The digest itself stays within half of the per-result budget
+        budget = min(b for b in (self.call_tokens, self.turn_tokens) if b > 0)
+        chars = budget * CHARS_PER_TOKEN // 2
+        lines = content.splitlines()
+
+        head = content[:chars // 2]
+        head_lines = head.count("\n")
+        tail, size = [], 0
+        for line in reversed(lines[head_lines + 1:]):
+            line = line[:DIGEST_LINE_CHARS]
+            if size + len(line) > chars // 3:
+                break
+            tail.append(line)
+            size += len(line) + 1
+        tail.reverse()
+        errors, size = [], 0
+        for n, line in enumerate(lines, 1):
+            if TEXT_ERROR_PATTERN.search(line):
+                line = line[:DIGEST_LINE_CHARS]
+                if size + len(line) > chars // 6:
+                    break
+                errors.append(f"L{n}: {line}")
+                size += len(line) + 1
+
+        omitted = max(0, len(lines) - head_lines - len(tail))
+        parts = [
+            f"[{label}: {tokens} tokens, {len(lines)} lines, over the {reason} result budget. "
+            f"Full result: {rel_path} (read it with DelegateAdmin operations=[{{\"op\": \"read\", \"path\": \"{rel_path}\"}}] if needed)]",
+            head,
+            f"... [{omitted} lines omitted] ...",
+            "\n".join(tail),
+        ]
+        if errors:
+            parts.append("[Lines matching error patterns]")
+            parts.extend(errors)
+        return "\n".join(parts)
+
+    def _spill(self, label: str, content: str, tokens: int, reason: str) -> str:
+        rel_path = os.path.join(RESULTS_DIR, f"res-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.txt")
+        try:
+            ralph_path("results")
+            with open(os.path.join(WORKSPACE_DIR, rel_path), "w", encoding="utf-8") as f:
+                f.write(content)
+        except OSError as e:
+            logger.error(f"Could not spill {label} result: {e}")
+            rel_path = "(not saved)"
+        logger.info(f"Result budget ({reason}): {label} ({tokens} tokens) spilled to {rel_path}")
+        return self._digest(label, content, tokens, rel_path, reason)
+
+    def apply(self, entries: List[Dict]) -> List[str]:
+        """
+        `entries`: [{"label": str, "content": str, "exempt": bool}] for one turn, in order.
+        Exempt entries (explicit reads of spilled results) are never spilled. Returns the contents to send.
+        """
+        contents = [e["content"] for e in entries]
+        tokens = [count_text_tokens(c) for c in contents]
+        spilled = [False] * len(entries)
+        call_hits = turn_hits = saved = 0
+
+        def spill(i: int, reason: str):
+            nonlocal saved
+            digest = self._spill(entries[i]["label"], contents[i], tokens[i], reason)
+            digest_tokens = count_text_tokens(digest)
+            saved += tokens[i] - digest_tokens
+            contents[i], tokens[i], spilled[i] = digest, digest_tokens, True
+
+        if self.call_tokens > 0:
+            for i, entry in enumerate(entries):
+                if not entry.get("exempt") and tokens[i] > self.call_tokens:
+                    spill(i, "per-call")
+                    call_hits += 1
+
+        if self.turn_tokens > 0:
+            # Largest results first until the turn fits. Results smaller than a digest are left alone.
+            digest_tokens = min(b for b in (self.call_tokens, self.turn_tokens) if b > 0) // 2
+            while sum(tokens) > self.turn_tokens:
+                candidates = [
+                    i for i, e in enumerate(entries)
+                    if not spilled[i] and not e.get("exempt") and tokens[i] > digest_tokens
+                ]
+                if not candidates:
+                    break
+                spill(max(candidates, key=lambda i: tokens[i]), "per-turn")
+                turn_hits += 1
+
+        with self._lock:
+            self.results += len(entries)
+            self.call_budget_hits += call_hits
+            self.turn_budget_hits += turn_hits
+            self.spilled_tokens += saved
+        return contents
+
+    def reset_stats(self):
+        with self._lock:
+            self.results = 0
+            self.call_budget_hits = 0
+            self.turn_budget_hits = 0
+            self.spilled_tokens = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "results": self.results,
+                "call_budget_hits": self.call_budget_hits,
+                "turn_budget_hits": self.turn_budget_hits,
+                "tokens_saved": self.spilled_tokens,
+            }
+
+def reads_spilled_results(args: dict) -> bool:
+    """True for a DelegateAdmin call that only reads spilled results (the Manager asked for them explicitly)."""
+    operations = args.get("operations") or []
+    return isinstance(operations, list) and bool(operations) and all(
+        isinstance(op, dict) and op.get("op") == "read" and isinstance(op.get("path"), str)
+        and os.path.normpath(op["path"]).startswith(RESULTS_DIR)
+        for op in operations
+    )
+
+result_budget = ResultBudget(RESULT_CALL_TOKENS, RESULT_TURN_TOKENS)
@@ -0,0 +1,291 @@
+import asyncio
+import heapq
+import itertools
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from config import SUBAGENT_MAX_CONCURRENCY, MODEL_CONCURRENCY, SUBAGENT_RPM
+from logger import logger
+
+# Lower value = served first when branches are waiting for a slot.
+# Commands are cheap and usually gate the next manager turn; research is the least urgent.
+LANE_PRIORITY = {
+    "command": 0,
+    "admin": 1,
+    "worker": 2,
+    "research": 3,
+}
+DEFAULT_PRIORITY = 2
+
+def _parse_reset(value: str) -> Optional[float]:
+    """
+    Parses a rate limit reset header into seconds from now.
+    Accepts OpenAI style durations ("1s", "6m0s", "250ms"), plain seconds and epoch milliseconds (OpenRouter).
+    """
+    value = str(value).strip()
+    if not value:
+        return None
+    if re.fullmatch(r"\d+(\.\d+)?", value):
+        number = float(value)
+        if number > 1e12:  # epoch ms
+            return max(0.0, number / 1000 - time.time())
+        return number
+    total = 0.0
+    matches = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not matches:
+        return None
+    for amount, unit in matches:
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total
+
+class TokenBucket:
+    """Request rate limiter. `rate_per_min` of 0 means unlimited until the provider reports a limit."""
+
+    def __init__(self, rate_per_min: float = 0):
+        self.rate_per_min = rate_per_min
+        self.capacity = max(rate_per_min, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        # Shared by the sync (threads) and async request paths of the chat models
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate_per_min:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_min / 60)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Takes a token if one is available. Returns 0, or the seconds to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if not self.rate_per_min:
+                return 0.0
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) * 60 / self.rate_per_min
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: Dict[str, Any]):
+        """Adapts to `x-ratelimit-*` / `retry-after` response headers."""
+        headers = {k.lower(): v for k, v in headers.items()}
+
+        limit = headers.get("x-ratelimit-limit-requests") or headers.get("x-ratelimit-limit")
+        if limit and not SUBAGENT_RPM:
+            try:
+                # OpenAI compatible providers report requests per minute
+                self.rate_per_min = float(limit)
+                self.capacity = max(self.rate_per_min, 1)
+            except ValueError:
+                pass
+
+        remaining = headers.get("x-ratelimit-remaining-requests") or headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset-requests") or headers.get("x-ratelimit-reset")
+        if remaining is not None:
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                remaining = None
+        if remaining is not None:
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and reset:
+                wait = _parse_reset(reset)
+                if wait:
+                    self.block_for(wait)
+
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            wait = _parse_reset(retry_after)
+            if wait:
+                self.block_for(wait)
+
+class ModelRateLimiter(BaseRateLimiter):
+    """
+    Chat model `rate_limiter`: LangChain calls it before every provider request, so the bucket counts
+    requests (each ReAct step of a sub-agent, every Manager turn) rather than branch starts.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.requests = 0
+        self.wait_s = 0.0
+
+    def _granted(self, started: float) -> bool:
+        self.requests += 1
+        self.wait_s += time.monotonic() - started
+        return True
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        started = time.monotonic()
+        while True:
+            delay = self.bucket.reserve()
+            if delay <= 0:
+                return self._granted(started)
+            if not blocking:
+                return False
+            time.sleep(delay)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        started = time.monotonic()
+        while True:
+            delay = self.bucket.reserve()
+            if delay <= 0:
+                return self._granted(started)
+            if not blocking:
+                return False
+            await asyncio.sleep(delay)
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """Feeds the rate limit headers of every response (`include_response_headers=True`) and 429 errors back into the scheduler."""
+
+    run_inline = True
+
+    def __init__(self, scheduler: "ModelScheduler"):
+        self.scheduler = scheduler
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                # Streamed responses carry the headers on the first chunk's generation info
+                headers = (getattr(message, "response_metadata", None) or {}).get("headers") \
+                    or (generation.generation_info or {}).get("headers")
+                if headers:
+                    self.scheduler.bucket.update_from_headers(headers)
+
+    def on_llm_error(self, error, **kwargs):
+        self.scheduler.on_error(error)
+
+class PriorityLimiter:
+    """Concurrency limiter that hands free slots to the highest priority waiter first."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: int):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._counter), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over right before cancellation: pass it on
+                self.release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Slot is transferred directly, `active` stays the same
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def depth(self) -> int:
+        return len(self._waiters)
+
+class ModelScheduler:
+    """
+    Bounds concurrent LLM-backed branches for one model (priority lanes) and rate limits its requests.
+    Pass `rate_limiter` and `callback` to every chat model of `model` (see nodes._chat_model).
+    """
+
+    def __init__(self, model: str, max_concurrency: int, rate_per_min: float = 0):
+        self.model = model
+        self.limiter = PriorityLimiter(max_concurrency)
+        self.bucket = TokenBucket(rate_per_min)
+        self.rate_limiter = ModelRateLimiter(self.bucket)
+        self.callback = RateLimitCallbackHandler(self)
+        self.stats = {}
+
+    def _lane_stats(self, lane: str) -> Dict[str, Any]:
+        return self.stats.setdefault(lane, {"queued": 0, "max_queued": 0, "started": 0, "wait_s": 0.0})
+
+    @asynccontextmanager
+    async def slot(self, lane: str):
+        """Waits for a free slot (by lane priority) before yielding. Requests are rate limited by `rate_limiter`."""
+        stats = self._lane_stats(lane)
+        stats["queued"] += 1
+        stats["max_queued"] = max(stats["max_queued"], stats["queued"])
+        start = time.monotonic()
+        try:
+            await self.limiter.acquire(LANE_PRIORITY.get(lane, DEFAULT_PRIORITY))
+        finally:
+            stats["queued"] -= 1
+
+        waited = time.monotonic() - start
+        stats["started"] += 1
+        stats["wait_s"] += waited
+        if waited > 1:
+            logger.info(f"⏳ {lane} branch waited {waited:.1f}s for a {self.model} slot (queue depth {self.limiter.depth()}).")
+        try:
+            yield
+        finally:
+            self.limiter.release()
+
+    def on_error(self, error: BaseException):
+        """Backs off the whole model when a request hits a 429."""
+        if getattr(error, "status_code", None) == 429:
+            response = getattr(error, "response", None)
+            headers = dict(getattr(response, "headers", {}) or {})
+            wait = _parse_reset(headers.get("retry-after", "")) or 5.0
+            logger.warning(f"Rate limited by provider for {self.model}. Pausing new requests for {wait:.1f}s.")
+            self.bucket.block_for(wait)
+
+    def reset_stats(self):
+        self.stats = {}
+        self.rate_limiter.requests = 0
+        self.rate_limiter.wait_s = 0.0
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "active": self.limiter.active,
+            "limit": self.limiter.limit,
+            "queue_depth": self.limiter.depth(),
+            "requests": self.rate_limiter.requests,
+            "rate_wait_s": round(self.rate_limiter.wait_s, 2),
+            "lanes": {lane: dict(s, wait_s=round(s["wait_s"], 2)) for lane, s in self.stats.items()},
+        }
+
+_schedulers: Dict[str, ModelScheduler] = {}
+
+def get_scheduler(model: str) -> ModelScheduler:
+    """Returns the process-wide scheduler for `model`."""
+    if model not in _schedulers:
+        limit = MODEL_CONCURRENCY.get(model, SUBAGENT_MAX_CONCURRENCY)
+        _schedulers[model] = ModelScheduler(model, limit, SUBAGENT_RPM)
+    return _schedulers[model]
+
+def scheduler_metrics() -> Dict[str, Any]:
+    """Queue depth / wait metrics of every model scheduler."""
+    return {model: s.metrics() for model, s in _schedulers.items()}
+
+def reset_scheduler_metrics():
+    """Starts the queue / wait metrics of every model scheduler over (limits and learned rates stay)."""
+    for scheduler in _schedulers.values():
+        scheduler.reset_stats()
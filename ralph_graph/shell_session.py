@@ -0,0 +1,275 @@
+"""
+Persistent shell sessions in the workspace container.
+Shared by ralph_graph and the legacy agent (ralph-agent/internal/shell_session.py re-exports it),
+so it only depends on the standard library; callers pass their logger.
+"""
+import atexit
+import logging
+import os
+import selectors
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# Time given to a timed out command after SIGTERM (then SIGKILL) before the next escalation step
+KILL_GRACE_SECONDS = 5
+
+# Runs one command in its own session (process group), so a timeout can kill exactly that command.
+# The session state (cwd + exported variables) lives in $1 and is carried from one command to the next:
+# restored before the command, saved when it exits (also on `exit N`).
+COMMAND_SCRIPT = r'''
+__ralph_state=$1
+. "$__ralph_state/env"
+cd "$(cat "$__ralph_state/cwd")" 2>/dev/null
+trap 'pwd > "$__ralph_state/cwd.tmp" && export -p > "$__ralph_state/env.tmp" && mv -f "$__ralph_state/cwd.tmp" "$__ralph_state/cwd" && mv -f "$__ralph_state/env.tmp" "$__ralph_state/env"' EXIT
+eval "$2"
+'''
+
+class ShellResult(NamedTuple):
+    stdout: str
+    stderr: str
+    returncode: Optional[int]
+    timed_out: bool
+
+def history_line(command: str, history_file: str) -> str:
+    """Shell snippet that appends `command` to the command history file."""
+    return f"printf '%s\\n' {shlex.quote(command)} >> {shlex.quote(history_file)}"
+
+class ShellSession:
+    """
+    A long-lived `/bin/sh` (normally `docker exec -i ... ralph-workspace /bin/sh`).
+    Commands are written to its stdin and their output is framed by per-command sentinels
+    on both stdout and stderr, so no `docker exec` is spawned per command.
+    Each command runs in its own process group (`setsid`) with the session's cwd and exported
+    variables, which persist between calls. A timed out command is killed without the session.
+    """
+
+    def __init__(self, argv: List[str], exec_prefix: List[str], history_file: Optional[str] = None,
+                 logger: Optional[logging.Logger] = None):
+        # exec_prefix runs one-off helper commands next to the shell (e.g. ["docker", "exec", "ralph-workspace"])
+        self.argv = argv
+        self.exec_prefix = exec_prefix
+        self.history_file = history_file
+        self.logger = logger or logging.getLogger(__name__)
+        # Inside the container; survives a restart of the shell, removed by close()
+        self.state_dir = f"/tmp/ralph-shell-{uuid.uuid4().hex[:12]}"
+        self.proc: Optional[subprocess.Popen] = None
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            self.argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0
+        )
+        state = shlex.quote(self.state_dir)
+        # The first shell of a session seeds the state; a restarted one carries on with it
+        self._run_framed(
+            f"mkdir -p {state} && {{ [ -f {state}/env ] || {{ export -p > {state}/env; pwd > {state}/cwd; }}; }}",
+            timeout=30,
+            record=False,
+            raw=True
+        )
+        self.logger.info(f"Started persistent shell session (pid {self.proc.pid}, state {self.state_dir}).")
+
+    def _stop(self):
+        """Ends the shell process. The session state is kept for the next shell."""
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=2)
+        except Exception:
+            self.proc.kill()
+        for stream in (self.proc.stdout, self.proc.stderr):
+            stream.close()
+        self.proc = None
+
+    def close(self):
+        """Ends the session: the next command starts over from the workspace root and environment."""
+        if self.alive():
+            try:
+                self.proc.stdin.write(f"rm -rf {shlex.quote(self.state_dir)}\n".encode("utf-8"))
+            except OSError:
+                pass
+        self._stop()
+
+    def _kill_command(self, signal: str):
+        """Signals the process group of the running command (its pid is written next to the state)."""
+        pid_file = shlex.quote(f"{self.state_dir}/pid")
+        subprocess.run(
+            self.exec_prefix + ["sh", "-c", f"kill -{signal} -$(cat {pid_file}) 2>/dev/null"],
+            capture_output=True,
+            timeout=10
+        )
+
+    def _exit_status(self) -> Optional[int]:
+        try:
+            return self.proc.wait(timeout=KILL_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            return None
+
+    def _run_framed(self, command: str, timeout: float, record: bool = True,
+                    on_output: Optional[Callable[[str, bytes], None]] = None, raw: bool = False) -> ShellResult:
+        """
+        Runs one framed command (`raw`: in the shell itself, for session housekeeping). Output is streamed
+        to `on_output(stream, chunk)` when given (the result then carries empty stdout/stderr),
+        otherwise collected into the result.
+        """
+        sentinel = f"__RALPH_DONE_{uuid.uuid4().hex}__"
+        state = shlex.quote(self.state_dir)
+        lines = []
+        if record and self.history_file:
+            lines.append(history_line(command, self.history_file))
+        if raw:
+            lines += [f"eval {shlex.quote(command)} </dev/null", "__ralph_rc=$?"]
+        else:
+            lines += [
+                # stdin is the control channel, so commands must not read from it
+                f"setsid env -i /bin/sh -c {shlex.quote(COMMAND_SCRIPT)} ralph {state} {shlex.quote(command)} </dev/null &",
+                f"echo $! > {state}/pid",
+                "wait $!",
+                "__ralph_rc=$?",
+            ]
+        lines += [
+            f"printf '\\n{sentinel} %s\\n' \"$__ralph_rc\"",
+            f"printf '\\n{sentinel}\\n' >&2",
+        ]
+        self.proc.stdin.write(("\n".join(lines) + "\n").encode("utf-8"))
+        self.proc.stdin.flush()
+
+        marker = f"\n{sentinel}".encode("utf-8")
+        # Bytes held back from `on_output` because they may be the start of the sentinel
+        holdback = len(marker) + 32
+        pending = {"stdout": bytearray(), "stderr": bytearray()}
+        done = {"stdout": False, "stderr": False}
+        rc_line = b""
+
+        collected = {"stdout": bytearray(), "stderr": bytearray()}
+        emit = on_output or (lambda name, data: collected[name].extend(data))
+
+        selector = selectors.DefaultSelector()
+        selector.register(self.proc.stdout, selectors.EVENT_READ, "stdout")
+        selector.register(self.proc.stderr, selectors.EVENT_READ, "stderr")
+
+        deadline = time.monotonic() + timeout
+        # Timeout escalation: SIGTERM to the command's process group, then SIGKILL, then give up on the shell
+        escalation = ["TERM", "KILL"]
+        timed_out = exited = False
+        try:
+            while not all(done.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if not escalation:
+                        raise TimeoutError
+                    timed_out = True
+                    self._kill_command(escalation.pop(0))
+                    deadline = time.monotonic() + KILL_GRACE_SECONDS
+                    continue
+
+                for key, _ in selector.select(timeout=min(remaining, 1.0)):
+                    name = key.data
+                    chunk = os.read(key.fileobj.fileno(), 65536)
+                    buf = pending[name]
+                    if not chunk:
+                        # The shell itself exited: keep what was printed, its exit status is the last word
+                        selector.unregister(key.fileobj)
+                        if buf:
+                            emit(name, bytes(buf))
+                            buf.clear()
+                        done[name] = exited = True
+                        continue
+                    buf += chunk
+                    idx = buf.find(marker)
+                    if idx == -1:
+                        if len(buf) > holdback:
+                            emit(name, bytes(buf[:-holdback]))
+                            del buf[:-holdback]
+                    elif buf.endswith(b"\n") and buf.rfind(b"\n") > idx:
+                        # Sentinel line is complete
+                        emit(name, bytes(buf[:idx]))
+                        if name == "stdout":
+                            rc_line = bytes(buf[idx + len(marker):])
+                        buf.clear()
+                        done[name] = True
+        except TimeoutError:
+            for name, buf in pending.items():
+                if buf:
+                    emit(name, bytes(buf))
+            raise
+        finally:
+            selector.close()
+
+        if timed_out:
+            returncode = None
+        else:
+            try:
+                returncode = int(rc_line.strip())
+            except ValueError:
+                returncode = self._exit_status() if exited else None
+        return ShellResult(
+            collected["stdout"].decode("utf-8", "replace"),
+            collected["stderr"].decode("utf-8", "replace"),
+            returncode,
+            timed_out
+        )
+
+    def run(self, command: str, timeout: float, on_output: Optional[Callable[[str, bytes], None]] = None) -> ShellResult:
+        """Runs `command` in the session. Restarts the shell (keeping cwd and exported variables) if it died."""
+        if not self.alive():
+            self.start()
+        try:
+            result = self._run_framed(command, timeout, on_output=on_output)
+        except TimeoutError:
+            self.logger.warning("Timed out command could not be killed. Restarting the shell of the session.")
+            self._stop()
+            return ShellResult("", "", None, True)
+        except BrokenPipeError:
+            self.logger.warning("Shell session exited. It will be restarted on the next command.")
+            self._stop()
+            return ShellResult("", "Shell session exited before the command could run.", None, False)
+        if not self.alive():
+            self.logger.warning(f"Shell session exited (code {result.returncode}). It will be restarted on the next command.")
+            self._stop()
+        return result
+
+class ShellSessionPool:
+    """Named shell sessions. A busy session is never shared: callers fall back to a one-shot exec."""
+
+    def __init__(self, argv: List[str], exec_prefix: List[str], history_file: Optional[str] = None,
+                 logger: Optional[logging.Logger] = None):
+        self.argv = argv
+        self.exec_prefix = exec_prefix
+        self.history_file = history_file
+        self.logger = logger
+        self._sessions: Dict[str, ShellSession] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close_all)
+
+    def try_run(self, command: str, timeout: float, name: str = "default",
+                on_output: Optional[Callable[[str, bytes], None]] = None) -> Optional[ShellResult]:
+        """Runs in the named session, or returns None when that session is busy."""
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+            if name not in self._sessions:
+                self._sessions[name] = ShellSession(self.argv, self.exec_prefix, self.history_file, self.logger)
+        if not lock.acquire(blocking=False):
+            return None
+        try:
+            return self._sessions[name].run(command, timeout, on_output)
+        finally:
+            lock.release()
+
+    def close_all(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
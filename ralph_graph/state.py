@@ -1,9 +1,13 @@
 import operator
 from typing import Annotated, List, Dict, Any, Union, Optional
-from typing_extensions import TypedDict
+from typing_extensions import TypedDict, NotRequired
 from langchain_core.messages import BaseMessage
+from langgraph.graph.message import add_messages
 
-def merge_dicts(a: Dict, b: Dict) -> Dict:
+def merge_dicts(a: Dict, b: Optional[Dict]) -> Dict:
+    # None resets the dict (the reducer clears `results` at the end of each iteration)
+    if b is None:
+        return {}
     return {**a, **b}
 
 class WorkerTask(TypedDict):
@@ -13,11 +17,14 @@ class WorkerTask(TypedDict):
     assigned_worker_id: str
     status: str
     result: Union[str, None]
+    # task_ids (or 0-based positions) of tasks in the same PlanTasks call that must finish first
+    depends_on: NotRequired[List[str]]
 
 class AgentState(TypedDict):
     """The global state of the Ralph Agent graph."""
     # Chat history
-    messages: Annotated[List[BaseMessage], operator.add]
+    # add_messages (instead of operator.add) lets the compactor replace the history
+    messages: Annotated[List[BaseMessage], add_messages]
     
     # The Implementation Plan context
     plan: str
@@ -28,13 +35,21 @@ class AgentState(TypedDict):
     # Queue for Admin Agent tasks
     admin_queue: List[Dict[str, Any]]
     
-    # Queue for Command Agent task (Singleton, but list allows flexibility if needed, or stick to dict if enforced)
-    # Using Optional[Dict] or List. Dispatcher sets it.
-    command_queue: Optional[Dict[str, Any]]
+    # Queue for Research Agent tasks
+    research_queue: List[Dict[str, Any]]
+
+    # Queue for Command Agent batches: {"commands": [...]}.
+    # Batches run in parallel, commands inside a batch (same sequence_group) run in order.
+    command_queue: List[Dict[str, Any]]
 
     # Results collected from workers (task_id -> result)
     # merged using merge_dicts to allow parallel updates
     results: Annotated[Dict[str, Any], merge_dicts]
     
+    # Running token total of `messages`.
+    # Nodes return the count of the messages they append (see token_ledger.py)
+    token_count: Annotated[int, operator.add]
+
     # Internal flags
+    # Number of Manager turns so far (incremented by the Manager node)
     iteration: int
@@ -1,7 +1,11 @@
 import json
 import os
-from typing import Dict, Any, List
+import struct
+import zlib
+from typing import Dict, Any, List, Optional
 from langchain_core.messages import messages_to_dict, messages_from_dict, BaseMessage
+from config import CHECKPOINT_DIR, SNAPSHOT_EVERY
+from message_store import message_store
 from state import AgentState
 
 STATE_FILE = ".state.json"
@@ -17,6 +21,7 @@ def save_state(state: AgentState, filepath: str = STATE_FILE):
         "plan": state.get("plan", ""),
         "pending_tasks": state.get("pending_tasks", []),
         "results": state.get("results", {}), # Results might be complex? Assuming JSON serializable for now
+        "token_count": state.get("token_count", 0),
         "iteration": state.get("iteration", 0)
     }
     
@@ -36,3 +41,164 @@ def load_state(filepath: str = STATE_FILE) -> AgentState:
         data["messages"] = messages_from_dict(data["messages"])
         
     return data
+
+# --- CHECKPOINT JOURNAL ---
+#
+# Layout of CHECKPOINT_DIR:
+#   snapshot.bin  - one frame holding the full state (rewritten atomically)
+#   journal.bin   - append-only frames holding only what changed since the previous frame
+#
+# Frame: [payload length: u32][crc32: u32][zlib(compact JSON)]
+# A torn or corrupt trailing frame is ignored on load, so the last good checkpoint always wins.
+
+FRAME_HEADER = struct.Struct(">II")
+SNAPSHOT_FILE = "snapshot.bin"
+JOURNAL_FILE = "journal.bin"
+
+# Small fields that are stored whole in every record
+SCALAR_KEYS = ("plan", "pending_tasks", "results", "token_count", "iteration")
+
+def _encode_frame(record: Dict[str, Any]) -> bytes:
+    payload = zlib.compress(json.dumps(record, separators=(",", ":"), default=str).encode("utf-8"))
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def _read_frames(data: bytes):
+    """Yields (end_offset, record) for every intact frame, stopping at the first bad one."""
+    offset = 0
+    while offset + FRAME_HEADER.size <= len(data):
+        length, crc = FRAME_HEADER.unpack_from(data, offset)
+        start = offset + FRAME_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        try:
+            record = json.loads(zlib.decompress(payload))
+        except (zlib.error, ValueError):
+            return
+        offset = start + length
+        yield offset, record
+
+class CheckpointJournal:
+    """
+    Append-only checkpointing for AgentState.
+    `record` appends only the messages added since the previous call, so the per-turn
+    save cost does not grow with the history. A full snapshot is written every
+    `snapshot_every` records, or whenever the history was rewritten (e.g. by compaction).
+    """
+
+    def __init__(self, directory: str = CHECKPOINT_DIR, snapshot_every: int = SNAPSHOT_EVERY):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        os.makedirs(directory, exist_ok=True)
+
+        # Snapshot generation. Journal records from another generation are stale.
+        self._generation = 0
+        self._records_since_snapshot = 0
+        self._saved_count = 0
+        self._last_id = None
+
+    def _scalars(self, state: AgentState) -> Dict[str, Any]:
+        return {k: state.get(k) for k in SCALAR_KEYS if k in state}
+
+    def _mark_saved(self, messages: List[BaseMessage]):
+        self._saved_count = len(messages)
+        self._last_id = messages[-1].id if messages else None
+
+    def _is_append_only(self, messages: List[BaseMessage]) -> bool:
+        n = self._saved_count
+        if n == 0 or len(messages) < n:
+            return False
+        return messages[n - 1].id == self._last_id
+
+    def snapshot(self, state: AgentState):
+        """Writes the full state atomically and starts a new journal generation."""
+        self._generation += 1
+        record = {
+            "kind": "snapshot",
+            "gen": self._generation,
+            "messages": messages_to_dict(state["messages"]),
+            **self._scalars(state)
+        }
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_encode_frame(record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # Deltas of the previous generation are now covered by the snapshot
+        open(self.journal_path, "wb").close()
+        self._records_since_snapshot = 0
+        self._mark_saved(state["messages"])
+
+    def record(self, state: AgentState):
+        """Persists the state after a graph step."""
+        messages = state["messages"]
+        if not self._is_append_only(messages) or self._records_since_snapshot >= self.snapshot_every:
+            self.snapshot(state)
+            return
+
+        record = {
+            "kind": "delta",
+            "gen": self._generation,
+            "base": self._saved_count,
+            "messages": messages_to_dict(messages[self._saved_count:]),
+            **self._scalars(state)
+        }
+        with open(self.journal_path, "ab") as f:
+            f.write(_encode_frame(record))
+            f.flush()
+            os.fsync(f.fileno())
+        self._records_since_snapshot += 1
+        self._mark_saved(messages)
+
+    def load(self) -> Optional[AgentState]:
+        """Rebuilds the last good state from the snapshot plus journal. None if nothing was saved."""
+        if not os.path.exists(self.snapshot_path):
+            return None
+
+        with open(self.snapshot_path, "rb") as f:
+            frames = list(_read_frames(f.read()))
+        if not frames:
+            return None
+        snapshot = frames[0][1]
+
+        self._generation = snapshot["gen"]
+        messages = messages_from_dict(snapshot.pop("messages"))
+        state = {k: v for k, v in snapshot.items() if k in SCALAR_KEYS}
+
+        good_offset = 0
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+            for offset, record in _read_frames(data):
+                if record.get("gen") != self._generation or record.get("base") != len(messages):
+                    break
+                messages.extend(messages_from_dict(record["messages"]))
+                state.update({k: v for k, v in record.items() if k in SCALAR_KEYS})
+                good_offset = offset
+                replayed += 1
+
+            # Drop any torn / stale tail so new records append after the last good one
+            if good_offset != len(data):
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(good_offset)
+
+        state["messages"] = messages
+        self._records_since_snapshot = replayed
+        self._mark_saved(messages)
+        return state
+
+    def clear(self):
+        """Removes all checkpoints (next run starts fresh)."""
+        for path in (self.snapshot_path, self.journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+        # Message bodies referenced by the cleared history
+        message_store.clear()
+        self._records_since_snapshot = 0
+        self._saved_count = 0
+        self._last_id = None
@@ -0,0 +1,69 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from state import WorkerTask
+
+def plan_waves(tasks: List[WorkerTask]) -> List[List[str]]:
+    """
+    Groups the tasks of one plan into topological waves (Kahn's algorithm): every task comes after the
+    tasks it depends on. Raises ValueError naming the tasks of a dependency cycle.
+    """
+    ids = [t["task_id"] for t in tasks]
+    dependents: Dict[str, List[str]] = {tid: [] for tid in ids}
+    indegree = {tid: 0 for tid in ids}
+    for task in tasks:
+        for dep in task.get("depends_on") or []:
+            dependents[dep].append(task["task_id"])
+            indegree[task["task_id"]] += 1
+
+    waves, ready, placed = [], [tid for tid in ids if indegree[tid] == 0], 0
+    while ready:
+        waves.append(ready)
+        placed += len(ready)
+        following = []
+        for tid in ready:
+            for child in dependents[tid]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    following.append(child)
+        ready = following
+
+    if placed < len(ids):
+        cycle = [tid for tid in ids if indegree[tid] > 0]
+        raise ValueError(f"dependency cycle between tasks {', '.join(cycle)}")
+    return waves
+
+class TaskDependencies:
+    """
+    Completion of the current Manager turn's worker tasks. A worker with `depends_on` waits here
+    (before taking a scheduler slot) until its dependencies finish, so each task starts as soon as
+    its own prerequisites are done instead of waiting for a whole wave.
+    """
+
+    def __init__(self):
+        self._done: Dict[str, asyncio.Event] = {}
+        self._results: Dict[str, Tuple[bool, str]] = {}
+
+    def _event(self, task_id: str) -> asyncio.Event:
+        return self._done.setdefault(task_id, asyncio.Event())
+
+    async def wait(self, task: WorkerTask) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+        """
+        Waits for all dependencies of `task`. Returns (first failed dependency or None,
+        [(dependency id, result)] of the finished ones).
+        """
+        deps = task.get("depends_on") or []
+        await asyncio.gather(*(self._event(dep).wait() for dep in deps))
+        failed = next((dep for dep in deps if not self._results[dep][0]), None)
+        return failed, [(dep, self._results[dep][1]) for dep in deps]
+
+    def finish(self, task_id: str, ok: bool, result: str):
+        self._results[task_id] = (ok, result)
+        self._event(task_id).set()
+
+    def reset(self):
+        """New Manager turn: task ids are unique per tool call, earlier ones are no longer awaited."""
+        self._done.clear()
+        self._results.clear()
+
+task_dependencies = TaskDependencies()
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# Flat imports, like the app (see daemon.py); the workspace must exist before config is imported
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("RALPH_WORKSPACE_DIR", tempfile.mkdtemp(prefix="ralph-test-"))
+
+import nodes
+from task_graph import plan_waves, task_dependencies
+
+def plan(tasks):
+    planned = []
+    nodes.handle_plan_tasks({"id": "call"}, {"tasks": tasks}, planned)
+    return planned
+
+def test_depends_on_first_task_by_position():
+    planned = plan([
+        {"description": "create api"},
+        {"description": "use api", "depends_on": 0},
+    ])
+    assert planned[1]["depends_on"] == ["call_0"]
+    assert plan_waves(planned) == [["call_0"], ["call_1"]]
+
+def test_dependent_task_runs_after_its_dependency(monkeypatch):
+    order = []
+
+    async def fake_subagent(lane, agent, inputs, agent_id=None):
+        order.append(f"start {agent_id}")
+        # The dependency is slower, the dependent task must still wait for it
+        await asyncio.sleep(0.05 if agent_id == "call_0" else 0)
+        order.append(f"end {agent_id}")
+        return {"messages": [type("Message", (), {"content": f"done {agent_id}"})()]}
+
+    monkeypatch.setattr(nodes, "run_subagent", fake_subagent)
+    monkeypatch.setattr(nodes, "create_worker_agent", lambda: None)
+    planned = plan([
+        {"description": "create api"},
+        {"description": "use api", "depends_on": 0},
+    ])
+
+    async def run():
+        task_dependencies.reset()
+        # Started in reverse order: the dependent task waits on its own
+        return await asyncio.gather(*(nodes.run_worker_task(t) for t in reversed(planned)))
+
+    results = asyncio.run(run())
+    assert order == ["start call_0", "end call_0", "start call_1", "end call_1"]
+    assert results == ["Worker call_1 Result: done call_1", "Worker call_0 Result: done call_0"]
@@ -0,0 +1,76 @@
+import json
+from functools import lru_cache
+from typing import Iterable
+
+from langchain_core.messages import BaseMessage
+
+from config import RALPH_MODEL, TOKENIZER_ENCODING
+from logger import logger
+
+# tiktoken only knows OpenAI model names. Anything else (Gemini, Devstral, ...) is
+# approximated with the closest general-purpose BPE encoding.
+DEFAULT_ENCODING = "cl100k_base"
+O200K_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
+# Rough chars-per-token ratio used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str = RALPH_MODEL):
+    """Returns a cached tiktoken encoder matching `model` (None if tiktoken is missing)."""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken not installed. Falling back to character based token estimates.")
+        return None
+
+    try:
+        if TOKENIZER_ENCODING:
+            return tiktoken.get_encoding(TOKENIZER_ENCODING)
+
+        # OpenRouter model ids are "<vendor>/<model>"
+        name = model.split("/")[-1].lower()
+        try:
+            return tiktoken.encoding_for_model(name)
+        except KeyError:
+            pass
+
+        encoding = "o200k_base" if name.startswith(O200K_PREFIXES) else DEFAULT_ENCODING
+        logger.info(f"No exact tokenizer for '{model}'. Using '{encoding}'.")
+        return tiktoken.get_encoding(encoding)
+    except Exception as e:
+        # e.g. BPE files cannot be downloaded (offline)
+        logger.warning(f"Failed to load tokenizer: {e}. Falling back to character based token estimates.")
+        return None
+
+def count_text_tokens(text: str) -> int:
+    """Counts tokens of a plain string with the encoder for RALPH_MODEL."""
+    if not text:
+        return 0
+    enc = get_encoder()
+    if enc is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+def message_text(msg: BaseMessage) -> str:
+    """Flattens a message (content + tool call arguments) into the text that is sent to the provider."""
+    content = msg.content
+    if isinstance(content, list):
+        # Multimodal / content-block messages
+        content = "".join(
+            block if isinstance(block, str) else str(block.get("text", ""))
+            for block in content
+        )
+    parts = [content or ""]
+    for tc in getattr(msg, "tool_calls", None) or []:
+        parts.append(tc.get("name", ""))
+        parts.append(json.dumps(tc.get("args", {}), ensure_ascii=False))
+    return "".join(parts)
+
+def count_message_tokens(messages: Iterable[BaseMessage]) -> int:
+    """
+    Counts tokens for newly appended messages.
+    Nodes return this as the `token_count` delta alongside their `messages` update,
+    so each message is encoded exactly once over the lifetime of the run.
+    """
+    return sum(count_text_tokens(message_text(msg)) for msg in messages)
@@ -1,28 +1,53 @@
 import os
+import selectors
 import subprocess
-import requests
+import time
 from langchain_core.tools import tool
-from config import WORKSPACE_DIR, CONTEXT7_API_KEY
-from logger import logger
+from config import WORKSPACE_DIR, PERSISTENT_SHELL
+from context7 import get_context7_client
+from file_cache import file_cache
+from jobs import job_registry
+from logger import logger, Truncated
+from output_capture import CommandCapture
+from tracing import span
+from shell_session import ShellSessionPool
 
 from functools import wraps
 
 class ToolError(Exception):
     pass
 
+def _payload_chars(value) -> int:
+    """Characters in the string values of a tool payload, counted without stringifying the payload."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_payload_chars(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_chars(v) for v in value)
+    return 0
+
 def log_tool_usage(func):
     """Decorator to log tool calls and results."""
     @wraps(func)
     def wrapper(*args, **kwargs):
         tool_name = func.name if hasattr(func, 'name') else func.__name__
-        try:
-            logger.info(f"🔧 Tool Call: {tool_name} | Args: {args} {kwargs}")
-            result = func(*args, **kwargs)
-            logger.info(f"✅ Tool Result: {tool_name} | Output: {str(result)[:500]}...") # Truncate long output
-            return result
-        except Exception as e:
-            logger.error(f"❌ Tool Error: {tool_name} | Error: {e}")
-            raise e
+        with span(tool_name, "tool") as s:
+            try:
+                # Truncated renders lazily, so large arguments / outputs are never stringified in full
+                logger.info("🔧 Tool Call: %s | Args: %s %s", tool_name, Truncated(args), Truncated(kwargs),
+                            extra={"fields": {"event": "tool_call", "tool": tool_name}})
+                result = func(*args, **kwargs)
+                output_chars = len(result) if isinstance(result, str) else None
+                logger.info("✅ Tool Result: %s | Output: %s", tool_name, Truncated(result),
+                            extra={"fields": {"event": "tool_result", "tool": tool_name, "output_chars": output_chars}})
+                if s:
+                    s.set(args_chars=_payload_chars(args) + _payload_chars(kwargs), output_chars=output_chars)
+                return result
+            except Exception as e:
+                logger.error("❌ Tool Error: %s | Error: %s", tool_name, e,
+                             extra={"fields": {"event": "tool_error", "tool": tool_name}})
+                raise e
     return wrapper
 
 def validate_path(path: str) -> str:
@@ -47,11 +72,8 @@ def read_file(path: str) -> str:
         if os.path.isdir(safe_path):
             return f"Error: '{path}' is a directory. Use list_dir instead."
             
-        with open(safe_path, "r", encoding="utf-8") as f:
-            content = f.read()
-            # logging handled by decorator now, but specific logic can stay if needed, 
-            # though decorator covers it.
-            return content
+        # Shared across workers, validated against mtime/size
+        return file_cache.read_text(safe_path)
     except Exception as e:
         # Error logging handled by decorator or we can return string error
         # The tool usually returns string errors to LLM not raises exception
@@ -79,6 +101,7 @@ def write_file(path: str, content: str, mode: str = "overwrite") -> str:
         
         with open(safe_path, file_mode, encoding="utf-8") as f:
             f.write(content)
+        file_cache.invalidate(safe_path)
         return f"Successfully wrote to {path} (mode={mode})"
     except Exception as e:
         return f"Error writing file: {e}"
@@ -89,13 +112,63 @@ def list_dir(path: str) -> str:
     """List files in a directory within the workspace."""
     try:
         safe_path = validate_path(path)
-        return str(os.listdir(safe_path))
+        return str(file_cache.list_dir(safe_path))
     except Exception as e:
         return f"Error listing directory: {e}"
 
 @tool
 @log_tool_usage
-def run_command(command: str, timeout: int = 120, background: bool = False) -> str:
+def stat_path(path: str) -> str:
+    """Show type, size and last modification time of a file or directory in the workspace."""
+    try:
+        safe_path = validate_path(path)
+        if not os.path.exists(safe_path):
+            return f"'{path}' does not exist."
+        st = os.stat(safe_path)
+        kind = "directory" if os.path.isdir(safe_path) else "file"
+        modified = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(st.st_mtime))
+        return f"{path}: {kind}, {st.st_size} bytes, modified {modified}"
+    except Exception as e:
+        return f"Error reading file info: {e}"
+
+# Long-lived shells inside the workspace container (see shell_session.py)
+shell_sessions = ShellSessionPool(
+    argv=["docker", "exec", "-i", "-w", WORKSPACE_DIR, "ralph-workspace", "/bin/sh"],
+    exec_prefix=["docker", "exec", "ralph-workspace"],
+    logger=logger
+)
+
+def run_oneshot(docker_args: list, timeout: int, capture: CommandCapture) -> int:
+    """Runs a one-off process, streaming its output into `capture`. Raises TimeoutExpired after `timeout`."""
+    proc = subprocess.Popen(docker_args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    selector = selectors.DefaultSelector()
+    selector.register(proc.stdout, selectors.EVENT_READ, "stdout")
+    selector.register(proc.stderr, selectors.EVENT_READ, "stderr")
+    deadline = time.monotonic() + timeout
+    open_streams = 2
+    try:
+        while open_streams:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                proc.kill()
+                raise subprocess.TimeoutExpired(docker_args, timeout)
+            for key, _ in selector.select(timeout=min(remaining, 1.0)):
+                chunk = os.read(key.fileobj.fileno(), 65536)
+                if chunk:
+                    capture.feed(key.data, chunk)
+                else:
+                    selector.unregister(key.fileobj)
+                    open_streams -= 1
+        return proc.wait(timeout=max(1, deadline - time.monotonic()))
+    finally:
+        selector.close()
+        proc.stdout.close()
+        proc.stderr.close()
+
+@tool
+@log_tool_usage
+def run_command(command: str, timeout: int = 120, background: bool = False, session: str = "default",
+                ready_port: int = 0, ready_pattern: str = "") -> str:
     """
     Run a shell command inside the persistent 'ralph-workspace' container.
     
@@ -103,39 +176,109 @@ def run_command(command: str, timeout: int = 120, background: bool = False) -> s
         command: The shell command to execute.
         timeout: Maximum time in seconds to wait for the command (default: 120).
                  If a command takes longer, increase this value or break the work into smaller steps.
-        background: If True, run command in detached mode (fire and forget). 
-                    Useful for starting servers (e.g., 'npm run dev'). 
-                    No output will be captured.
+        background: If True, start the command as a background job (e.g. 'npm run dev') and return its job ID.
+                    Output goes to the job log. Use job_status / job_tail / job_wait_ready / job_kill with the ID.
+        session: Name of the persistent shell session to use (default: "default").
+                 The working directory and exported variables persist between commands of the same session.
+                 A command issued while its session is busy with another one runs in a fresh shell in the
+                 workspace root instead (the output says so); use distinct sessions for parallel commands.
+        ready_port: (background only) Wait until this port accepts connections before returning.
+        ready_pattern: (background only) Wait until the job log matches this regex before returning.
+                       Waiting is bounded by `timeout`.
 
     Returns:
         Command output (STDOUT + STDERR) or status message.
     """
+    timeout_msg = f"Error: Command timed out after {timeout} seconds. Consider increasing the timeout or breaking the task into smaller steps."
+    # Output is streamed into a bounded capture; large outputs are spilled to .ralph/logs/ in the workspace
+    capture = CommandCapture()
     try:
         # We assume the container 'ralph-workspace' is running.
-        
-        docker_args = ["docker", "exec", "-w", WORKSPACE_DIR]
-        
-        if background:
-            docker_args.append("-d")
-        
-        docker_args.extend(["ralph-workspace", "/bin/sh", "-c", command])
-        
+
         if background:
-            subprocess.run(docker_args, check=True)
-            return f"Command started in background: {command}"
-        
-        result = subprocess.run(docker_args, capture_output=True, text=True, timeout=timeout)
-        
-        output = f"STDOUT:\n{result.stdout}\nSTDERR:\n{result.stderr}"
-        if result.returncode != 0:
-             output += f"\nExit Code: {result.returncode}"
-        return output
-        
+            job = job_registry.start(command)
+            output = f"Started background job {job.job_id} (pid {job.pid}). Log: {job.log_path}"
+            if ready_port or ready_pattern:
+                output += "\n" + job_registry.wait_ready(job.job_id, ready_port, ready_pattern, timeout)
+            return output
+
+        if PERSISTENT_SHELL:
+            result = shell_sessions.try_run(command, timeout, session, on_output=capture.feed)
+            if result is not None:
+                capture.close()
+                output = capture.render(result.returncode)
+                if result.stderr:
+                    # Session level error (the shell was gone before the command ran)
+                    output += f"\n{result.stderr}"
+                return f"{output}\n{timeout_msg}" if result.timed_out else output
+            # Session busy (parallel command): fall back to a one-shot exec, and tell the caller
+            logger.info(f"Shell session '{session}' is busy. Using a one-shot exec.")
+            note = (f"Note: shell session '{session}' was busy with another command, so this ran in a fresh shell "
+                    f"in the workspace root, without the session's working directory and exported variables.")
+        else:
+            note = ""
+
+        docker_args = ["docker", "exec", "-w", WORKSPACE_DIR, "ralph-workspace", "/bin/sh", "-c", command]
+        try:
+            returncode = run_oneshot(docker_args, timeout, capture)
+            capture.close()
+            output = capture.render(returncode)
+        except subprocess.TimeoutExpired:
+            capture.close()
+            output = f"{capture.render(None)}\n{timeout_msg}"
+        return f"{note}\n{output}" if note else output
+
     except subprocess.TimeoutExpired:
-        return f"Error: Command timed out after {timeout} seconds. Consider increasing the timeout or breaking the task into smaller steps."
+        capture.close()
+        return f"{capture.render(None)}\n{timeout_msg}"
     except Exception as e:
+        capture.close()
         return f"Docker Execution Error: {e}"
 
+@tool
+@log_tool_usage
+def job_status(job_id: str) -> str:
+    """Show whether a background job (started with run_command(background=True)) is running or how it exited."""
+    try:
+        return job_registry.status(job_id)
+    except Exception as e:
+        return f"Job Error: {e}"
+
+@tool
+@log_tool_usage
+def job_tail(job_id: str, lines: int = 50) -> str:
+    """Show the last `lines` lines of a background job's log."""
+    try:
+        return job_registry.tail(job_id, lines) or "(log is empty)"
+    except Exception as e:
+        return f"Job Error: {e}"
+
+@tool
+@log_tool_usage
+def job_wait_ready(job_id: str, port: int = 0, log_pattern: str = "", timeout: int = 60) -> str:
+    """
+    Wait until a background job is ready instead of polling with sleep/curl.
+    
+    Args:
+        job_id: The job ID returned by run_command(background=True).
+        port: Ready once this port accepts connections inside the container.
+        log_pattern: Ready once the job log matches this regex (e.g. "ready|listening on").
+        timeout: Maximum seconds to wait.
+    """
+    try:
+        return job_registry.wait_ready(job_id, port, log_pattern, timeout)
+    except Exception as e:
+        return f"Job Error: {e}"
+
+@tool
+@log_tool_usage
+def job_kill(job_id: str) -> str:
+    """Stop a background job and all of its child processes."""
+    try:
+        return job_registry.kill(job_id)
+    except Exception as e:
+        return f"Job Error: {e}"
+
 @tool
 @log_tool_usage
 def git_commit(message: str) -> str:
@@ -179,69 +322,7 @@ def context7_tool(query: str, library_name: str) -> str:
         Relevant documentation snippets.
     """
     try:
-        headers = {}
-        if CONTEXT7_API_KEY:
-            headers["Authorization"] = f"Bearer {CONTEXT7_API_KEY}"
-            
-        # Step 1: Search for valid library ID
-        search_url = "https://context7.com/api/v2/libs/search"
-        search_params = {"libraryName": library_name, "query": query}
-        
-        search_response = requests.get(search_url, headers=headers, params=search_params)
-        search_response.raise_for_status()
-        
-        search_data = search_response.json()
-        libraries = search_data.get("results", []) if isinstance(search_data, dict) else search_data
-        
-        if not libraries:
-            return f"Context7: No library found for '{library_name}'."
-            
-        # Use top match
-        best_match = libraries[0]
-        library_id = best_match.get("id")
-        library_real_name = best_match.get("title")
-        
-        if not library_id:
-             return f"Context7: Invalid library data found for '{library_name}'."
-
-        # Step 2: Get Context
-        context_url = "https://context7.com/api/v2/context"
-        context_params = {
-            "libraryId": library_id,
-            "query": query,
-            "type": "json" 
-        }
-        
-        context_response = requests.get(context_url, headers=headers, params=context_params)
-        context_response.raise_for_status()
-        
-        c_data = context_response.json()
-        
-        code_snippets = c_data.get("codeSnippets", [])
-        info_snippets = c_data.get("infoSnippets", [])
-        
-        if not code_snippets and not info_snippets:
-            return f"Context7: Found library '{library_real_name}' but no documentation returned for query '{query}'."
-            
-        output = [f"--- Context7 Results for '{library_real_name}' ---"]
-        
-        for snippet in code_snippets:
-            title = snippet.get("codeTitle", "Untitled")
-            desc = snippet.get("codeDescription", "")
-            output.append(f"\nTitle: {title}\nDescription: {desc}")
-            
-            code_list = snippet.get("codeList", [])
-            for code_item in code_list:
-                lang = code_item.get("language", "")
-                code = code_item.get("code", "")
-                output.append(f"Code ({lang}):\n{code}")
-        
-        for snippet in info_snippets:
-             title = snippet.get("title", "Untitled")
-             content = snippet.get("content", "")
-             output.append(f"\nTitle: {title}\nContent: {content}")
-             
-        return "\n".join(output)
-
+        # Pooled session + on-disk cache (see context7.py)
+        return get_context7_client().search(query, library_name)
     except Exception as e:
         return f"Context7 Error: {e}"
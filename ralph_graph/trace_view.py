@@ -0,0 +1,125 @@
+"""
+Shows where the time of an iteration goes, from the JSONL traces written by tracing.py.
+
+Usage:
+    python trace_view.py                      # latest trace file, every iteration
+    python trace_view.py logs/traces/x.jsonl --iteration 3 --tree
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import TRACE_DIR
+
+def load_spans(path: str) -> List[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def label(span: dict) -> str:
+    attrs = span.get("attrs") or {}
+    extra = []
+    if span["kind"] == "llm":
+        extra.append(f"model={attrs.get('model')}")
+        if attrs.get("input_tokens") is not None:
+            extra.append(f"in={attrs.get('input_tokens')} out={attrs.get('output_tokens')} cached={attrs.get('cached_tokens')}")
+    elif span["kind"] == "tool":
+        extra.append(f"out={attrs.get('output_chars')} chars")
+    elif span["kind"] == "agent" and attrs.get("queue_seconds"):
+        extra.append(f"queued={attrs['queue_seconds']}s")
+    if attrs.get("error"):
+        extra.append(f"ERROR {attrs['error']}")
+    return f"{span['kind']}:{span['name']}" + (f" ({', '.join(extra)})" if extra else "")
+
+def extent_end(span: dict, children: Dict[str, List[dict]]) -> float:
+    """End of the span including its descendants (Send branches outlive the dispatcher span)."""
+    if "_extent" not in span:
+        span["_extent"] = max([span["end"]] + [extent_end(c, children) for c in children.get(span["span_id"], [])])
+    return span["_extent"]
+
+def critical_path(span: dict, children: Dict[str, List[dict]], depth: int = 0) -> List[tuple]:
+    """
+    The chain of spans that bounds `span`'s wall time: walking back from its end, the child whose work
+    finished last, then the one that had finished before that child started, and so on (recursively).
+    """
+    chain = []
+    cursor = extent_end(span, children) + 1e-6
+    candidates = sorted(
+        children.get(span["span_id"], []),
+        key=lambda s: (extent_end(s, children), s["start"]),
+        reverse=True
+    )
+    for child in candidates:
+        if child["end"] <= cursor:
+            chain.append(child)
+            cursor = child["start"] + 1e-6
+    path = []
+    for child in reversed(chain):
+        path.append((depth, child))
+        path.extend(critical_path(child, children, depth + 1))
+    return path
+
+def print_tree(span: dict, children: Dict[str, List[dict]], origin: float, depth: int = 0):
+    offset = span["start"] - origin
+    print(f"{'  ' * depth}{label(span)}  +{offset:.2f}s  {span['duration']:.3f}s")
+    for child in sorted(children.get(span["span_id"], []), key=lambda s: s["start"]):
+        print_tree(child, children, origin, depth + 1)
+
+def report(spans: List[dict], iteration: int = None, tree: bool = False):
+    by_trace = defaultdict(list)
+    for s in spans:
+        by_trace[s["trace_id"]].append(s)
+
+    for trace in by_trace.values():
+        ids = {s["span_id"] for s in trace}
+        roots = [s for s in trace if s["parent_id"] not in ids]
+        root = max(roots, key=lambda s: s["duration"])
+        number = (root.get("attrs") or {}).get("iteration")
+        if iteration is not None and number != iteration:
+            continue
+
+        children = defaultdict(list)
+        for s in trace:
+            if s is not root and s["parent_id"] in ids:
+                children[s["parent_id"]].append(s)
+
+        print(f"=== Iteration {number if number is not None else '?'}: {root['duration']:.2f}s, {len(trace)} spans ===")
+        print("Critical path:")
+        for depth, s in critical_path(root, children):
+            share = 100 * s["duration"] / root["duration"] if root["duration"] else 0
+            print(f"  {'  ' * depth}{label(s)}  {s['duration']:.3f}s ({share:.0f}%)")
+
+        totals = defaultdict(lambda: [0, 0.0])
+        for s in trace:
+            if s is not root:
+                key = f"{s['kind']}:{s['name']}"
+                totals[key][0] += 1
+                totals[key][1] += s["duration"]
+        print("Time by span (summed, parallel spans overlap):")
+        for key, (count, total) in sorted(totals.items(), key=lambda kv: -kv[1][1])[:15]:
+            print(f"  {key:<28} x{count:<4} {total:8.3f}s")
+
+        if tree:
+            print("Tree:")
+            print_tree(root, children, root["start"], 1)
+        print()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Critical path viewer for ralph_graph traces")
+    parser.add_argument("trace", nargs="?", help="Trace file (default: latest in the trace directory)")
+    parser.add_argument("--iteration", type=int, help="Only show this iteration")
+    parser.add_argument("--tree", action="store_true", help="Also print the full span tree")
+    args = parser.parse_args()
+
+    path = args.trace
+    if path is None:
+        files = sorted(glob.glob(os.path.join(TRACE_DIR, "*.jsonl")), key=os.path.getmtime)
+        if not files:
+            sys.exit(f"No traces in {TRACE_DIR}")
+        path = files[-1]
+    print(f"Trace: {path}\n")
+    report(load_spans(path), args.iteration, args.tree)
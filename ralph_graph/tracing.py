@@ -0,0 +1,174 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import TRACE_ENABLED, TRACE_DIR
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "end", "attrs")
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], parent_id: Optional[str] = None):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent_id or (parent.span_id if parent else None)
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.end = None
+        self.attrs: Dict[str, Any] = {}
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "end": self.end,
+            "duration": round(self.end - self.start, 6),
+            "attrs": self.attrs,
+        }
+
+class JsonlExporter:
+    """Appends finished spans to one JSONL file per process run."""
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl")
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+exporter = JsonlExporter(TRACE_DIR)
+
+# Current span of this thread / asyncio task (copied into Send branches, to_thread and executor calls)
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("ralph_span", default=None)
+
+def current_span_id() -> Optional[str]:
+    span = _current.get()
+    return span.span_id if span else None
+
+@contextmanager
+def span(name: str, kind: str = "internal", parent_id: Optional[str] = None, **attrs):
+    """
+    Opens a child span of the current one. `parent_id` overrides the parent
+    (used across Send fan-out, where the dispatcher is no longer on the stack).
+    """
+    if not TRACE_ENABLED:
+        yield None
+        return
+    s = Span(name, kind, _current.get(), parent_id)
+    s.attrs.update(attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        s.end = time.time()
+        exporter.export(s)
+
+def _node_attrs(s: Span, state, result):
+    if isinstance(state, dict) and "messages" in state:
+        s.set(input_messages=len(state["messages"]))
+    if isinstance(result, dict):
+        s.set(
+            output_messages=len(result.get("messages") or []),
+            token_delta=result.get("token_count", 0),
+            result_bytes=sum(len(str(v)) for v in (result.get("results") or {}).values())
+        )
+
+def traced_node(name: str):
+    """Wraps a graph node (sync or async) in a `node` span. Branch nodes link to `parent_span_id` from their Send payload."""
+    def decorator(fn):
+        def parent_of(state):
+            return state.get("parent_span_id") if isinstance(state, dict) else None
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(state, *args, **kwargs):
+                with span(name, "node", parent_id=parent_of(state)) as s:
+                    result = await fn(state, *args, **kwargs)
+                    if s:
+                        _node_attrs(s, state, result)
+                    return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(state, *args, **kwargs):
+            with span(name, "node", parent_id=parent_of(state)) as s:
+                result = fn(state, *args, **kwargs)
+                if s:
+                    _node_attrs(s, state, result)
+                return result
+        return wrapper
+    return decorator
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """`llm` spans for every chat model request, with token counts and payload sizes."""
+
+    # Cheap enough to run on the event loop; keeps the caller's span context
+    run_inline = True
+
+    def __init__(self):
+        self._open: Dict[Any, Span] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        if not TRACE_ENABLED:
+            return
+        s = Span("llm", "llm", _current.get())
+        model = (kwargs.get("invocation_params") or {}).get("model") or (kwargs.get("metadata") or {}).get("ls_model_name")
+        s.set(model=model, input_messages=sum(len(batch) for batch in messages),
+              input_chars=sum(len(str(m.content)) for batch in messages for m in batch))
+        self._open[run_id] = s
+
+    def _finish(self, run_id, **attrs):
+        s = self._open.pop(run_id, None)
+        if not s:
+            return
+        s.set(**attrs)
+        s.end = time.time()
+        exporter.export(s)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        attrs = {}
+        try:
+            message = response.generations[0][0].message
+            usage = getattr(message, "usage_metadata", None) or {}
+            attrs = {
+                "input_tokens": usage.get("input_tokens"),
+                "output_tokens": usage.get("output_tokens"),
+                "cached_tokens": (usage.get("input_token_details") or {}).get("cache_read"),
+                "output_chars": len(str(message.content)),
+                "tool_calls": len(getattr(message, "tool_calls", None) or []),
+            }
+        except (IndexError, AttributeError):
+            pass
+        self._finish(run_id, **attrs)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=f"{type(error).__name__}: {error}")
+
+tracing_handler = TracingCallbackHandler()
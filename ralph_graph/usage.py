@@ -0,0 +1,149 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import MODEL_PRICES
+from logger import logger, LOGS_DIR
+
+# (lane, agent id) of the current sub-agent task, set by run_subagent
+_agent: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar("ralph_agent", default=None)
+
+@contextmanager
+def agent_scope(lane: str, agent_id: Optional[str] = None):
+    token = _agent.set((lane, agent_id))
+    try:
+        yield
+    finally:
+        _agent.reset(token)
+
+def _empty() -> Dict[str, float]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost": 0.0}
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    price = MODEL_PRICES.get(model)
+    if not price:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+class UsageLedger:
+    """
+    Provider-reported token usage of every LLM call, aggregated per node, agent, iteration, model and run.
+    Calls are appended to logs/usage.jsonl, the aggregate is rewritten to logs/usage-summary.json.
+    """
+
+    def __init__(self, directory: str):
+        self.calls_path = os.path.join(directory, "usage.jsonl")
+        self.summary_path = os.path.join(directory, "usage-summary.json")
+        self._lock = threading.Lock()
+        self._runs = itertools.count(1)
+        self.reset()
+
+    def reset(self):
+        """Starts a new run (new run id, empty aggregates)."""
+        with self._lock:
+            # Sequence number: a daemon process runs several sessions
+            self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._runs)}"
+            self.iteration = 0
+            self.groups = {key: defaultdict(_empty) for key in ("node", "agent", "iteration", "model")}
+            self.total = _empty()
+            self.missing_usage = 0
+
+    def record(self, model: str, node: str, agent: str, usage: dict, cost: Optional[float]):
+        prompt = usage.get("input_tokens", 0) or 0
+        completion = usage.get("output_tokens", 0) or 0
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        if cost is None:
+            cost = estimate_cost(model, prompt, completion)
+        entry = {
+            "run_id": self.run_id,
+            "ts": time.time(),
+            "iteration": self.iteration,
+            "node": node,
+            "agent": agent,
+            "model": model,
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "cached_tokens": cached,
+            "cost": cost,
+        }
+        with self._lock:
+            keys = {"node": node, "agent": agent, "iteration": str(self.iteration), "model": model}
+            for bucket in [self.total] + [self.groups[g][k] for g, k in keys.items()]:
+                bucket["calls"] += 1
+                bucket["prompt_tokens"] += prompt
+                bucket["completion_tokens"] += completion
+                bucket["cached_tokens"] += cached
+                bucket["cost"] += cost or 0.0
+            with open(self.calls_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "iterations": self.iteration,
+                "total": dict(self.total),
+                "calls_without_usage": self.missing_usage,
+                **{f"by_{group}": {k: dict(v) for k, v in buckets.items()} for group, buckets in self.groups.items()},
+            }
+
+    def flush(self):
+        """Rewrites the summary file (atomically)."""
+        tmp = self.summary_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        os.replace(tmp, self.summary_path)
+
+usage_ledger = UsageLedger(LOGS_DIR)
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Feeds `usage_ledger` from the usage metadata of every chat model response."""
+
+    run_inline = True
+
+    def __init__(self, ledger: UsageLedger):
+        self.ledger = ledger
+        self._scopes: Dict[object, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        # Outermost graph node, e.g. "worker:<id>|agent:<id>" -> worker
+        namespace = metadata.get("langgraph_checkpoint_ns") or metadata.get("langgraph_node") or "unknown"
+        node = namespace.split("|")[0].split(":")[0]
+        model = (kwargs.get("invocation_params") or {}).get("model") or metadata.get("ls_model_name") or "unknown"
+        scope = _agent.get()
+        if scope:
+            # Sub-agent work counts towards its branch node, even when it was started early by the Manager
+            lane, agent_id = scope
+            node, agent = lane, f"{lane}:{agent_id}" if agent_id else lane
+        else:
+            agent = node
+        self._scopes[run_id] = (node, agent, model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        node, agent, model = self._scopes.pop(run_id, ("unknown", "unknown", "unknown"))
+        try:
+            message = response.generations[0][0].message
+        except (IndexError, AttributeError):
+            return
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            self.ledger.missing_usage += 1
+            logger.debug(f"No usage metadata on {model} response ({node}/{agent}).")
+            return
+        # OpenRouter reports the billed cost when usage accounting is requested
+        token_usage = (message.response_metadata or {}).get("token_usage") or (response.llm_output or {}).get("token_usage") or {}
+        self.ledger.record(model, node, agent, usage, token_usage.get("cost"))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._scopes.pop(run_id, None)
+
+usage_handler = UsageCallbackHandler(usage_ledger)